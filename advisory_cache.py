@@ -0,0 +1,140 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = "cache/advisory_cache.sqlite3"
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 5000
+MAX_BYTES = 50 * 1024 * 1024
+# Prices within ~2% of each other share a bucket
+PRICE_BUCKET = 0.02
+
+
+def price_bucket(price):
+    if not price or price <= 0:
+        return 0
+    return int(math.floor(math.log(price) / math.log1p(PRICE_BUCKET)))
+
+
+def cache_key(details, price, market_context, template, model=""):
+    """Key on normalized inputs plus hashes of the retrieved context and prompt template.
+
+    Listings with the same location/BHK/bath whose predicted price lands in the
+    same bucket, and that retrieved the same market context, share one report.
+    """
+    parts = {
+        "location": " ".join(str(details.get("location", "")).split()).casefold(),
+        "bhk": int(details.get("bhk") or 0),
+        "bath": int(details.get("bath") or 0),
+        "price_bucket": price_bucket(price),
+        "context": hashlib.sha256(market_context.encode("utf-8")).hexdigest(),
+        "template": hashlib.sha256(template.encode("utf-8")).hexdigest(),
+        "model": model,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class AdvisoryCache:
+    """SQLite-backed report cache with TTL expiry and LRU size-based eviction."""
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared across threads, serialised by self._lock;
+        # WAL lets the Streamlit app and other processes read concurrently.
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS advisory (
+                key TEXT PRIMARY KEY,
+                report TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS advisory_last_access ON advisory(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT report, created_at FROM advisory WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE advisory SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, report):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO advisory (key, report, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, report, len(report.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM advisory WHERE created_at < ?", (now - self.ttl,))
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM advisory"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently used, dropping rows until under both limits
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM advisory ORDER BY last_access"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM advisory WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM advisory")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM advisory"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
+
+
+_lock = threading.Lock()
+_cache = None
+
+
+def get_cache():
+    """Shared cache instance, or None when ADVISORY_CACHE_PATH is set to an empty string."""
+    global _cache
+    path = os.getenv("ADVISORY_CACHE_PATH", CACHE_PATH)
+    if not path:
+        return None
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = AdvisoryCache(path)
+    return _cache
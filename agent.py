@@ -1,120 +1,209 @@
 import os
-import pickle
+import operator
+import time
 import numpy as np
 import pandas as pd
 from typing import TypedDict, List, Annotated, Dict
-from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
+from langchain_core.messages.ai import add_usage
 from dotenv import load_dotenv
+from model_registry import registry
+from location_index import get_location_index
+from comps import get_comps_index
+from tree_engine import get_compiled
+from advisory_cache import cache_key, get_cache
+from llm import get_llm, llm_id
+from llm_gateway import LLMUnavailable, get_gateway
+from vector_store import get_embeddings, get_market_index, search_market
+import telemetry
+from telemetry import metrics, span, traced
 
 load_dotenv()
+telemetry.configure()
+
+NO_MARKET_CONTEXT = "No specific market data available."
+ADVISORY_UNAVAILABLE = ("The AI advisory is temporarily unavailable (the language model is rate limited "
+                        "or not responding). The valuation and comparables above are still valid; "
+                        "please try again shortly.")
+NO_COMPS = "No comparable listings available."
 
 # --- State Definition ---
 class AgentState(TypedDict):
     property_details: Dict
     predicted_price: float
     market_context: str
+    comparables: Dict
     advisory_report: str
-    steps: List[str]
+    # Correlates this run's spans in the exported metrics (telemetry.py)
+    trace_id: str
+    # Valuation and research run in parallel, so each node returns only the
+    # keys it changes and new steps are appended rather than overwritten.
+    steps: Annotated[List[str], operator.add]
 
 # --- Helper Functions ---
 def load_ml_artifacts():
     try:
-        model = pickle.load(open('models/trained_model.pkl', 'rb'))
-        label_encoder = pickle.load(open('models/label_encoder.pkl', 'rb'))
-        columns = pickle.load(open('models/columns.pkl', 'rb'))
-        return model, label_encoder, columns
+        # Loaded once per process; reloaded only when the files change on disk.
+        # The forest is served through the flat-array engine (same predictions).
+        model = get_compiled('model')
+        locations = get_location_index()
+        columns = registry.get('columns')
+        return model, locations, columns
     except Exception as e:
         print(f"Error loading models: {e}")
         return None, None, None
 
+def _emit(event: Dict):
+    # Custom stream event for stream_advisory; a no-op under invoke/ainvoke
+    try:
+        get_stream_writer()(event)
+    except RuntimeError:
+        pass  # node called directly, outside a graph run
+
+def _stream_tokens(config: RunnableConfig):
+    return bool((config or {}).get("configurable", {}).get("stream_tokens"))
+
 # --- Node Definitions ---
 
+@traced("valuation")
 def valuation_node(state: AgentState):
     print("--- NODE: Valuation ---")
+    _emit({"type": "node", "node": "valuation"})
     details = state['property_details']
-    model, le, cols = load_ml_artifacts()
+    with span("artifact_load"):
+        model, locations, cols = load_ml_artifacts()
     
     if not model:
-        return {**state, "predicted_price": 0.0, "steps": state['steps'] + ["Failed to load ML model"]}
+        return {"predicted_price": 0.0, "steps": ["Failed to load ML model"]}
     
     try:
-        location = details.get('location', 'other')
-        if location in le.classes_:
-            loc_encoded = le.transform([location])[0]
-        else:
-            loc_encoded = le.transform(['other'])[0]
-            
-        features = np.array([[
-            loc_encoded, 
-            details.get('total_sqft', 1000), 
-            details.get('bath', 2), 
-            details.get('bhk', 2)
-        ]])
+        with span("encode"):
+            location = details.get('location', 'other')
+            loc_encoded, method, matched = locations.resolve(location)
+            metrics.inc("location_resolution_total", method=method)
+            if method == "unknown":
+                return {"predicted_price": 0.0, "steps": [f"Valuation error: unknown location '{location}'"]}
+                
+            features = np.array([[
+                loc_encoded, 
+                details.get('total_sqft', 1000), 
+                details.get('bath', 2), 
+                details.get('bhk', 2)
+            ]])
         
-        prediction = model.predict(features)[0]
+        with span("predict"):
+            prediction = model.predict(features)[0]
+        step = f"Valuation completed: ₹{prediction:.2f} Lakhs"
+        if method != "exact":
+            step += f" (location matched to '{matched}' by {method})"
         return {
-            **state, 
             "predicted_price": prediction, 
-            "steps": state['steps'] + [f"Valuation completed: ₹{prediction:.2f} Lakhs"]
+            "steps": [step]
         }
     except Exception as e:
-        return {**state, "predicted_price": 0.0, "steps": state['steps'] + [f"Valuation error: {str(e)}"]}
+        return {"predicted_price": 0.0, "steps": [f"Valuation error: {str(e)}"]}
 
+@traced("research")
 def market_research_node(state: AgentState):
     print("--- NODE: Market Research ---")
+    _emit({"type": "node", "node": "research"})
     location = state['property_details'].get('location', 'Bangalore')
     
     try:
-        # Use local HuggingFace embeddings
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=embeddings)
-        
-        # Search for location-specific info and general info
-        results = vectorstore.similarity_search(location, k=2)
-        general_results = vectorstore.similarity_search("Investment Advice Regulation", k=2)
+        # Search with the same canonical name valuation resolves to, so typos
+        # such as "Whitefeild" still hit the metadata index
+        query = location
+        try:
+            with span("encode"):
+                _, resolved, matched = get_location_index().resolve(location)
+            if resolved in ("exact", "alias", "fuzzy"):
+                query = matched
+        except FileNotFoundError:
+            pass  # no label encoder yet; research still works on the raw name
+
+        # Location docs come from the metadata index when possible (falling back
+        # to one vector search); general context is precomputed per corpus version
+        with span("search") as s:
+            results, general_results, method = search_market(query)
+            s.set(method=method)
+        metrics.inc("agent_research_matches_total", method=method)
         
         context = "\n".join([doc.page_content for doc in results + general_results])
         return {
-            **state, 
             "market_context": context, 
-            "steps": state['steps'] + [f"Retrieved market trends for {location}"]
+            "steps": [f"Retrieved market trends for {query} ({method} match)"]
         }
     except Exception as e:
         return {
-            **state, 
-            "market_context": "No specific market data available.", 
-            "steps": state['steps'] + [f"Research error: {str(e)}"]
+            "market_context": NO_MARKET_CONTEXT, 
+            "steps": [f"Research error: {str(e)}"]
         }
 
-def advisory_node(state: AgentState):
-    print("--- NODE: Advisory Reasoning ---")
-    # Using ChatGroq with Llama 3.3 70B for high-quality reasoning
-    llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0.1)
-    
+@traced("comps")
+def comps_node(state: AgentState):
+    print("--- NODE: Comparables ---")
+    _emit({"type": "node", "node": "comps"})
     details = state['property_details']
-    price = state['predicted_price']
-    context = state['market_context']
+    location = details.get('location', 'other')
     
-    prompt = f"""
+    try:
+        with span("comps_lookup"):
+            index = get_comps_index()
+            if index is None:
+                return {"comparables": {}, "steps": ["Comparables index not built"]}
+            loc_encoded, method, _ = get_location_index().resolve(location)
+            comps = None
+            if method != "unknown":
+                comps = index.query(
+                    loc_encoded,
+                    details.get('total_sqft', 1000),
+                    details.get('bhk', 2),
+                    details.get('bath', 2)
+                )
+        if not comps:
+            return {"comparables": {}, "steps": [f"No comparable listings for {location}"]}
+        return {
+            "comparables": comps,
+            "steps": [f"Found {len(comps['listings'])} comparable listings among {comps['count']} in {location}"]
+        }
+    except Exception as e:
+        return {"comparables": {}, "steps": [f"Comparables error: {str(e)}"]}
+
+def format_comps(comps: Dict):
+    if not comps:
+        return NO_COMPS
+    pps = comps['price_per_sqft']
+    lines = [
+        f"Price per sqft across {comps['count']} listings in this location: "
+        f"25th percentile ₹{pps['p25']:,.0f}, median ₹{pps['p50']:,.0f}, 75th percentile ₹{pps['p75']:,.0f}"
+    ]
+    for c in comps['listings']:
+        lines.append(f"- {c['total_sqft']:.0f} sqft, {c['bhk']} BHK, {c['bath']} Bath: "
+                     f"₹{c['price']:.2f} Lakhs (₹{c['price_per_sqft']:,.0f}/sqft)")
+    return "\n".join(lines)
+
+ADVISORY_PROMPT = """
     You are an expert Real Estate Investment Advisor for the Bangalore market.
     
     Property Details:
-    - Location: {details.get('location')}
-    - Size: {details.get('total_sqft')} sqft
-    - Configuration: {details.get('bhk')} BHK, {details.get('bath')} Bath
+    - Location: {location}
+    - Size: {total_sqft} sqft
+    - Configuration: {bhk} BHK, {bath} Bath
     - Predicted Market Value: ₹{price:.2f} Lakhs
     
     Market Context:
     {context}
     
+    Comparable Listings (real listings near this size and configuration):
+    {comps}
+    
     Task:
     Generate a structured advisory report for a potential investor. Include the following sections:
     1. SUMMARY: A brief overview of the property's value proposition.
-    2. COMPS: Briefly mention how this property compares to the micro-market based on context.
+    2. COMPS: Compare this property with the comparable listings and the location's price-per-sqft range above. Do not invent other comparables.
     3. ACTION: Clear "Buy", "Hold", or "Invest" recommendation with reasoning.
     4. DISCLAIMER: Standard financial/legal notice.
     
@@ -123,13 +212,100 @@ def advisory_node(state: AgentState):
     - Be professional and data-driven.
     - Reduce hallucinations: if data is missing, state it clearly.
     """
+
+def build_advisory_prompt(state: AgentState):
+    details = state['property_details']
+    return ADVISORY_PROMPT.format(
+        location=details.get('location'),
+        total_sqft=details.get('total_sqft'),
+        bhk=details.get('bhk'),
+        bath=details.get('bath'),
+        price=state['predicted_price'],
+        context=state['market_context'],
+        comps=format_comps(state.get('comparables')),
+    )
+
+def _advisory_cache_key(state: AgentState):
+    # Only cache reports built on a real valuation and retrieved context
+    cache = get_cache()
+    if cache is None or not state['predicted_price'] or state['market_context'] == NO_MARKET_CONTEXT:
+        return cache, None
+    # Comps are part of the prompt, so they are part of the context hash too
+    context = state['market_context'] + "\n" + format_comps(state.get('comparables'))
+    key = cache_key(state['property_details'], state['predicted_price'],
+                    context, ADVISORY_PROMPT, llm_id())
+    return cache, key
+
+def _advisory_result(report: str, cached: bool):
+    metrics.inc("advisory_cache_total", result="hit" if cached else "miss")
+    step = "Advisory report served from cache" if cached else "Advisory report generated by AI"
+    return {"advisory_report": report, "steps": [step]}
+
+def _advisory_unavailable(error, streaming=False):
+    # Not cached: the next request should try the LLM again
+    metrics.inc("advisory_unavailable_total")
+    if streaming:
+        _emit({"type": "token", "content": ADVISORY_UNAVAILABLE})
+    return {"advisory_report": ADVISORY_UNAVAILABLE, "steps": [f"Advisory error: {error}"]}
+
+@traced("advisory")
+def advisory_node(state: AgentState, config: RunnableConfig = None):
+    print("--- NODE: Advisory Reasoning ---")
+    _emit({"type": "node", "node": "advisory"})
+    streaming = _stream_tokens(config)
+    cache, key = _advisory_cache_key(state)
+    if key is not None:
+        report = cache.get(key)
+        if report is not None:
+            if streaming:
+                _emit({"type": "token", "content": report})
+            return _advisory_result(report, cached=True)
     
-    response = llm.invoke(prompt)
-    return {
-        **state, 
-        "advisory_report": response.content, 
-        "steps": state['steps'] + ["Advisory report generated by AI"]
-    }
+    # Shared client (ChatGroq with Llama 3.3 70B by default, or the offline
+    # stub) behind the gateway: identical prompts share one call, and
+    # concurrency, retries and the deadline are bounded
+    prompt = build_advisory_prompt(state)
+    try:
+        with span("llm_call", streaming=streaming):
+            if streaming:
+                chunks, usage = [], None
+                for chunk in get_gateway().stream(prompt):
+                    chunks.append(chunk.content)
+                    if chunk.usage_metadata:
+                        usage = add_usage(usage, chunk.usage_metadata)
+                    _emit({"type": "token", "content": chunk.content})
+                report = "".join(chunks)
+            else:
+                response = get_gateway().invoke(prompt)
+                report, usage = response.content, response.usage_metadata
+    except LLMUnavailable as e:
+        return _advisory_unavailable(e, streaming)
+    telemetry.record_llm_usage(prompt, report, usage)
+    if key is not None:
+        cache.put(key, report)
+    return _advisory_result(report, cached=False)
+
+@traced("advisory")
+async def aadvisory_node(state: AgentState):
+    # Used by aget_advisory: awaits the LLM call instead of parking a worker
+    # thread on it for the whole generation.
+    print("--- NODE: Advisory Reasoning ---")
+    cache, key = _advisory_cache_key(state)
+    if key is not None:
+        report = cache.get(key)
+        if report is not None:
+            return _advisory_result(report, cached=True)
+    
+    prompt = build_advisory_prompt(state)
+    try:
+        with span("llm_call", streaming=False):
+            response = await get_gateway().ainvoke(prompt)
+    except LLMUnavailable as e:
+        return _advisory_unavailable(e)
+    telemetry.record_llm_usage(prompt, response.content, response.usage_metadata)
+    if key is not None:
+        cache.put(key, response.content)
+    return _advisory_result(response.content, cached=False)
 
 # --- Build the Graph ---
 
@@ -137,25 +313,97 @@ builder = StateGraph(AgentState)
 
 builder.add_node("valuation", valuation_node)
 builder.add_node("research", market_research_node)
-builder.add_node("advisory", advisory_node)
+builder.add_node("comps", comps_node)
+builder.add_node("advisory", RunnableLambda(advisory_node, afunc=aadvisory_node))
 
-builder.set_entry_point("valuation")
-builder.add_edge("valuation", "research")
-builder.add_edge("research", "advisory")
+# Research and comps only need the property details, so they fan out
+# alongside valuation and advisory waits for all three branches.
+builder.add_edge(START, "valuation")
+builder.add_edge(START, "research")
+builder.add_edge(START, "comps")
+builder.add_edge(["valuation", "research", "comps"], "advisory")
 builder.add_edge("advisory", END)
 
 # Compile
 property_agent = builder.compile()
 
-def get_advisory(details: Dict):
-    initial_state = {
+def _initial_state(details: Dict):
+    return {
         "property_details": details,
         "predicted_price": 0.0,
         "market_context": "",
+        "comparables": {},
         "advisory_report": "",
+        "trace_id": telemetry.new_trace_id(),
         "steps": []
     }
-    return property_agent.invoke(initial_state)
+
+def warm_up():
+    """Load everything the first advisory would otherwise pay for.
+
+    Meant for a background thread after the UI has rendered; each step is
+    timed and failures are reported rather than raised.
+    """
+    steps = [
+        ("ml artifacts", load_ml_artifacts),
+        ("location index", get_location_index),
+        ("comps index", get_comps_index),
+        ("embedding model", lambda: get_embeddings().embed_query("warm up")),
+        ("vector store", get_market_index),
+        ("llm client", get_llm),
+    ]
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up: {name} failed: {e}")
+        timings[name] = time.perf_counter() - start
+    print("Warm-up done: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
+
+def get_advisory(details: Dict):
+    state = _initial_state(details)
+    with span("agent", trace_id=state['trace_id']):
+        result = property_agent.invoke(state)
+    metrics.maybe_export()
+    return result
+
+async def aget_advisory(details: Dict):
+    # Many advisories can share one event loop, e.g. asyncio.gather(*[aget_advisory(d) for d in batch])
+    state = _initial_state(details)
+    with span("agent", trace_id=state['trace_id']):
+        result = await property_agent.ainvoke(state)
+    metrics.maybe_export()
+    return result
+
+def stream_advisory(details: Dict):
+    """Run the graph, yielding events as they happen instead of one final state.
+
+    Events are dicts with a "type" of:
+      - "node":  a node started ({"node": name})
+      - "step":  a node finished and logged a step ({"node": name, "text": ...})
+      - "token": a chunk of the advisory report ({"content": ...})
+      - "done":  the final state ({"state": ...}), same shape as get_advisory's result
+    """
+    state = _initial_state(details)
+    config = {"configurable": {"stream_tokens": True}}
+    started = time.perf_counter()
+    for mode, chunk in property_agent.stream(state, config=config, stream_mode=["custom", "updates"]):
+        if mode == "custom":
+            yield chunk
+            continue
+        for node, update in chunk.items():
+            for key, value in (update or {}).items():
+                state[key] = state[key] + value if key == "steps" else value
+            for text in (update or {}).get("steps", []):
+                yield {"type": "step", "node": node, "text": text}
+    # A generator can't hold a span open across yields, so the whole run is
+    # recorded once it finishes
+    metrics.observe("agent_span_seconds", time.perf_counter() - started, span="agent")
+    metrics.maybe_export()
+    yield {"type": "done", "state": state}
 
 if __name__ == "__main__":
     # Test
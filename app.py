@@ -1,10 +1,14 @@
+import threading
 import streamlit as st
-import pickle
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from agent import get_advisory
+from model_registry import registry
+from location_index import index_for
+from tree_engine import get_compiled, get_compact, compact_version
+from price_surface import get_surface
+from comps import get_comps_index
 
 st.set_page_config(
     page_title="PropAI: Intelligent Real Estate",
@@ -36,22 +40,73 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
-@st.cache_resource
+# Not wrapped in st.cache_resource: the shared registry already keeps one copy
+# per process and swaps in retrained artifacts when the files change.
 def load_artifacts():
     try:
-        model = pickle.load(open('models/trained_model.pkl', 'rb'))
-        label_encoder = pickle.load(open('models/label_encoder.pkl', 'rb'))
-        columns = pickle.load(open('models/columns.pkl', 'rb'))
+        # Tree models are served through the flat-array engine (identical predictions)
+        model = get_compiled('model')
+        label_encoder = registry.get('label_encoder')
+        columns = registry.get('columns')
         # Attempt to load a Decision Tree model if it exists
         try:
-            dt_model = pickle.load(open('models/decision_tree_model.pkl', 'rb'))
+            dt_model = get_compiled('decision_tree')
         except FileNotFoundError:
             dt_model = None
-        return model, dt_model, label_encoder, columns
+        # Pruned float32 exports written by train.py (or `tree_engine.py --compact`)
+        compact_models = {}
+        for name in ('model', 'decision_tree'):
+            try:
+                compact_models[name] = get_compact(name)
+            except FileNotFoundError:
+                pass
+        return model, dt_model, compact_models, label_encoder, columns
     except FileNotFoundError:
         st.error("Model files not found. Please run the training notebook first.")
-        return None, None, None, None
-model, dt_model, label_encoder, columns = load_artifacts()
+        return None, None, {}, None, None
+model, dt_model, compact_models, label_encoder, columns = load_artifacts()
+
+# Selector label -> (registry name, compact export?)
+MODEL_CHOICES = {
+    "Random Forest": ('model', False),
+    "Random Forest (Compact)": ('model', True),
+    "Decision Tree": ('decision_tree', False),
+    "Decision Tree (Compact)": ('decision_tree', True),
+}
+
+def model_version(model_name, compact):
+    return compact_version(model_name) if compact else registry.version(model_name)
+
+def predict_price(model_name, predictor, loc_encoded, total_sqft, bhk, bath, compact=False):
+    # Answer from the precomputed price surface when one exists for this model version
+    # (surfaces are built from the full models, so compact exports always predict live)
+    surface = None if compact else get_surface(model_name)
+    if surface is not None:
+        price = surface.lookup(loc_encoded, total_sqft, bhk, bath)
+        if price is not None:
+            return price
+    return predictor.predict(np.array([[loc_encoded, total_sqft, bath, bhk]]))[0]
+
+@st.cache_data(show_spinner=False)
+def sensitivity_grid(model_name, model_version, loc_encoded, total_sqft, bhk, bath, compact=False):
+    # model_version is part of the cache key so a retrained model is never served stale results
+    predictor = get_compact(model_name) if compact else get_compiled(model_name)
+    surface = None if compact else get_surface(model_name)
+    combos = [
+        (b, ba)
+        for b in range(max(1, bhk-1), min(11, bhk+2))
+        for ba in range(max(1, bath-1), min(11, bath+2))
+    ]
+    prices = [surface.lookup(loc_encoded, total_sqft, b, ba) if surface else None for b, ba in combos]
+    
+    # Whatever the surface doesn't cover is evaluated in a single batched predict
+    missing = [i for i, p in enumerate(prices) if p is None]
+    if missing:
+        features = np.array([[loc_encoded, total_sqft, combos[i][1], combos[i][0]] for i in missing])
+        for i, p in zip(missing, predictor.predict(features)):
+            prices[i] = p
+    
+    return pd.DataFrame([{"BHK": b, "Bath": ba, "Price": p} for (b, ba), p in zip(combos, prices)])
 
 if label_encoder is not None and columns is not None:
     locations = list(label_encoder.classes_)
@@ -64,10 +119,17 @@ if label_encoder is not None and columns is not None:
     with col1:
         st.markdown("#### 🏠Property Details")
         st.markdown("<p style='color: #888; font-size: 0.9em; margin-top: -10px;'>Adjust the parameters below:</p>", unsafe_allow_html=True)
-        # Model selector: show Decision Tree option only if artifact exists
+        # Model selector: show Decision Tree and compact options only if their artifacts exist
+        available = {
+            ('model', False): True,
+            ('model', True): 'model' in compact_models,
+            ('decision_tree', False): dt_model is not None,
+            ('decision_tree', True): 'decision_tree' in compact_models,
+        }
+        model_options = [label for label, key in MODEL_CHOICES.items() if available[key]]
         model_choice = "Random Forest"
-        if dt_model is not None:
-            model_choice = st.selectbox("� Model", ["Random Forest", "Decision Tree"], index=0)
+        if len(model_options) > 1:
+            model_choice = st.selectbox("� Model", model_options, index=0)
         else:
             st.caption("Using Random Forest (Decision Tree model not found)")
 
@@ -87,25 +149,26 @@ if label_encoder is not None and columns is not None:
         tab1, tab2, tab3 = st.tabs(["💵 Valuation", "📊 Insights", "🤖 AI Advisor"])
         with tab1:
             if predict_clicked:
-                try:
-                    if location in label_encoder.classes_:
-                        loc_encoded = label_encoder.transform([location])[0]
-                    else:
-                        st.warning("Location not found in training data. Using 'other'.")
-                        loc_encoded = label_encoder.transform(['other'])[0]
-                except:
-                    loc_encoded = 0
+                loc_encoded, match, matched = index_for(label_encoder).resolve(location)
+                if match == "unknown":
+                    st.error(f"Location '{location}' not found in training data.")
+                    st.stop()
+                elif match == "other":
+                    st.warning("Location not found in training data. Using 'other'.")
+                elif match != "exact":
+                    st.info(f"Using closest known location: {matched}")
 
-                features = np.array([[loc_encoded, total_sqft, bath, bhk]])
                 # Choose model based on user selection
-                selected_model = model
-                if 'model_choice' in locals() and model_choice == 'Decision Tree':
-                    if dt_model is not None:
-                        selected_model = dt_model
-                    else:
-                        st.warning("Decision Tree model not found on disk. Falling back to Random Forest.")
+                selected_name, selected_compact = MODEL_CHOICES[model_choice]
+                if selected_compact:
+                    selected_model = compact_models[selected_name]
+                elif selected_name == 'decision_tree':
+                    selected_model = dt_model
+                else:
+                    selected_model = model
 
-                prediction = selected_model.predict(features)[0]
+                prediction = predict_price(selected_name, selected_model, loc_encoded, total_sqft, bhk, bath,
+                                           compact=selected_compact)
                 
                 st.markdown(
                     f"""
@@ -122,14 +185,10 @@ if label_encoder is not None and columns is not None:
                 with st.expander("Analysis: Why this price?", expanded=True):
                     st.write(f"**Price per Sqft:** ₹ {prediction*100000/total_sqft:,.0f} / sqft")
                     
-                    sens_data = []
-                    for b in range(max(1, bhk-1), min(11, bhk+2)):
-                        for ba in range(max(1, bath-1), min(11, bath+2)):
-                            f_sens = np.array([[loc_encoded, total_sqft, ba, b]])
-                            p_sens = selected_model.predict(f_sens)[0]
-                            sens_data.append({"BHK": b, "Bath": ba, "Price": p_sens})
-                    
-                    sens_df = pd.DataFrame(sens_data)
+                    sens_df = sensitivity_grid(
+                        selected_name, model_version(selected_name, selected_compact),
+                        int(loc_encoded), total_sqft, bhk, bath, selected_compact
+                    ).copy()
                     
                     st.write("---")
                     st.markdown("##### Price Sensitivity")
@@ -172,9 +231,7 @@ if label_encoder is not None and columns is not None:
             st.markdown("#### Model Performance")
             col_m1, col_m2, col_m3 = st.columns(3)
             # Show architecture depending on which model is selected (or available)
-            arch_display = "Random Forest"
-            if 'model_choice' in locals() and model_choice == 'Decision Tree':
-                arch_display = "Decision Tree"
+            arch_display = model_choice
             col_m1.metric("Architecture", arch_display)
             col_m2.metric("Accuracy (R²)", "76.0%")
             col_m3.metric("Avg Error", "₹ 23.2 Lakhs")
@@ -183,9 +240,13 @@ if label_encoder is not None and columns is not None:
             
             st.markdown("#### Factor Influence")
             # Use the selected model for feature importance when available
-            selected_for_importance = model
-            if 'model_choice' in locals() and model_choice == 'Decision Tree' and dt_model is not None:
+            importance_name, importance_compact = MODEL_CHOICES[model_choice]
+            if importance_compact:
+                selected_for_importance = compact_models[importance_name]
+            elif importance_name == 'decision_tree':
                 selected_for_importance = dt_model
+            else:
+                selected_for_importance = model
 
             if hasattr(selected_for_importance, 'feature_importances_'):
                 importance_df = pd.DataFrame({
@@ -216,6 +277,31 @@ if label_encoder is not None and columns is not None:
             else:
                 st.info("Feature importance is not available.")
 
+            st.divider()
+
+            st.markdown("#### Comparable Listings")
+            comps_index = get_comps_index()
+            comp_code, comp_match, _ = index_for(label_encoder).resolve(location)
+            comps = None
+            if comps_index is not None and comp_match != "unknown":
+                comps = comps_index.query(comp_code, total_sqft, bhk, bath)
+            if comps:
+                pps = comps["price_per_sqft"]
+                col_c1, col_c2, col_c3 = st.columns(3)
+                col_c1.metric("Price/Sqft (25th pct)", f"₹ {pps['p25']:,.0f}")
+                col_c2.metric("Price/Sqft (Median)", f"₹ {pps['p50']:,.0f}")
+                col_c3.metric("Price/Sqft (75th pct)", f"₹ {pps['p75']:,.0f}")
+                comps_df = pd.DataFrame(comps["listings"]).rename(columns={
+                    "total_sqft": "Sqft", "bhk": "BHK", "bath": "Bath",
+                    "price_per_sqft": "₹ / Sqft", "price": "Price (Lakhs)"
+                })
+                st.dataframe(comps_df, hide_index=True, use_container_width=True)
+                st.caption(f"Closest of {comps['count']} listings in {location} by size and configuration.")
+            elif comps_index is None:
+                st.info("Comparables index not built. Run `python comps.py` (or retrain with `train.py`).")
+            else:
+                st.info(f"No comparable listings for {location} in the training data.")
+
         with tab3:
             st.markdown(
                 """
@@ -231,22 +317,20 @@ if label_encoder is not None and columns is not None:
             )
             
             if st.button("✨ Generate AI Advisory Report", type="primary", use_container_width=True):
-                with st.status("🤖 Agent processing workflow...", expanded=True) as status:
-                    details = {
-                        "location": location,
-                        "total_sqft": total_sqft,
-                        "bath": bath,
-                        "bhk": bhk
-                    }
-                    
-                    st.write("🔍 `[Node: Valuation]` Valuing property based on ML model...")
-                    result = get_advisory(details)
-                    
-                    for step in result.get('steps', []):
-                        st.write(f"✅ {step}")
-                    
-                    status.update(label="✅ Advisory Report Successfully Generated!", state="complete", expanded=False)
+                details = {
+                    "location": location,
+                    "total_sqft": total_sqft,
+                    "bath": bath,
+                    "bhk": bhk
+                }
+                node_labels = {
+                    "valuation": "🔍 `[Node: Valuation]` Valuing property based on ML model...",
+                    "research": "📚 `[Node: Research]` Retrieving market trends...",
+                    "comps": "🏘️ `[Node: Comps]` Finding comparable listings...",
+                    "advisory": "🧠 `[Node: Advisory]` Writing the advisory report...",
+                }
                 
+                status = st.status("🤖 Agent processing workflow...", expanded=True)
                 st.markdown("<br>", unsafe_allow_html=True)
                 
                 # Render report in a dedicated card-like wrapper
@@ -256,8 +340,27 @@ if label_encoder is not None and columns is not None:
                                 border: 1px solid rgba(255, 255, 255, 0.08); box-shadow: 0 10px 30px rgba(0,0,0,0.5);">
                     """, unsafe_allow_html=True
                 )
+                report_placeholder = st.empty()
                 
-                st.markdown(result['advisory_report'])
+                # Steps and report tokens are rendered as the agent produces them
+                report = ""
+                result = None
+                # The agent stack (LangGraph, Chroma, embeddings, Groq) is imported
+                # here rather than at the top so the valuation UI renders without it
+                from agent import stream_advisory
+                for event in stream_advisory(details):
+                    if event["type"] == "node":
+                        status.write(node_labels.get(event["node"], event["node"]))
+                    elif event["type"] == "step":
+                        status.write(f"✅ {event['text']}")
+                    elif event["type"] == "token":
+                        report += event["content"]
+                        report_placeholder.markdown(report + "▌")
+                    elif event["type"] == "done":
+                        result = event["state"]
+                
+                report_placeholder.markdown(result['advisory_report'])
+                status.update(label="✅ Advisory Report Successfully Generated!", state="complete", expanded=False)
                 st.markdown("</div><br>", unsafe_allow_html=True)
                 
                 col_dl1, col_dl2, col_dl3 = st.columns([1,2,1])
@@ -269,3 +372,18 @@ if label_encoder is not None and columns is not None:
                         mime="text/markdown",
                         use_container_width=True
                     )
+
+# --- Background warm-up ---
+# Runs after the rest of the script so the first paint never waits on it;
+# cache_resource makes it start once per server process, not once per rerun.
+def _warm_agent():
+    import agent
+    agent.warm_up()
+
+@st.cache_resource(show_spinner=False)
+def start_agent_warm_up():
+    thread = threading.Thread(target=_warm_agent, name="agent-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+start_agent_warm_up()
@@ -0,0 +1,247 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Never call Groq or reuse cached reports from a benchmark run
+os.environ["ADVISOR_LLM"] = "stub"
+os.environ["ADVISORY_CACHE_PATH"] = ""
+
+import llm
+from location_index import index_for
+from model_registry import registry
+from tree_engine import get_compiled
+
+DEFAULT_OUTPUT = "benchmarks/latest.json"
+
+
+def sample_requests(n, seed=0):
+    rng = np.random.default_rng(seed)
+    locations = registry.get('label_encoder').classes_
+    return [
+        {
+            "location": str(rng.choice(locations)),
+            "total_sqft": int(rng.integers(6, 60)) * 50,
+            "bath": int(rng.integers(1, 5)),
+            "bhk": int(rng.integers(1, 5)),
+        }
+        for _ in range(n)
+    ]
+
+
+def summarize(latencies, wall_seconds, concurrency, batch_size=1):
+    ms = np.asarray(latencies) * 1000
+    return {
+        "n": len(ms),
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "requests_per_sec": len(ms) / wall_seconds if wall_seconds else 0.0,
+        "rows_per_sec": len(ms) * batch_size / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+class BenchmarkFailed(Exception):
+    pass
+
+
+def agent_error(state):
+    """The failure an agent node or run reported instead of raising, or None."""
+    if not isinstance(state, dict):
+        return None
+    if "predicted_price" in state and not state["predicted_price"]:
+        return state.get("steps", ["no valuation"])[-1]
+    for step in state.get("steps", []):
+        if step.startswith("Failed") or " error:" in step:
+            return step
+    return None
+
+
+def measure(fn, inputs, concurrency=1, warmup=3, batch_size=1):
+    """Call fn on every input with `concurrency` threads; per-call latency plus throughput.
+
+    Raises BenchmarkFailed if any call reports an error, so a failing path
+    is never timed as if it succeeded.
+    """
+    def timed(item):
+        start = time.perf_counter()
+        result = fn(item)
+        seconds = time.perf_counter() - start
+        error = agent_error(result)
+        if error:
+            raise BenchmarkFailed(f"{getattr(fn, '__name__', fn)}: {error}")
+        return seconds
+
+    # Nodes print progress lines; keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in inputs[:warmup]:
+            timed(item)
+        start = time.perf_counter()
+        if concurrency == 1:
+            latencies = [timed(item) for item in inputs]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(timed, inputs))
+        wall = time.perf_counter() - start
+    return summarize(latencies, wall, concurrency, batch_size)
+
+
+# --- Benchmarks ---
+
+def bench_inference(requests, batch_sizes):
+    """The app's inference paths: single-row predict, the sensitivity grid and bulk batches."""
+    import bulk_valuation
+
+    label_encoder = registry.get('label_encoder')
+    codes, _ = bulk_valuation.encode_locations(label_encoder, [r["location"] for r in requests])
+    rows = np.array([[c, r["total_sqft"], r["bath"], r["bhk"]] for c, r in zip(codes, requests)], dtype=float)
+
+    locations = index_for(label_encoder)
+    results = {
+        "app.encode_location[exact]": measure(locations.encode, [r["location"] for r in requests]),
+        # Typos go through the fuzzy matcher once, then hit its memo
+        "app.encode_location[typo]": measure(locations.encode, [r["location"][:-1] + "x" for r in requests]),
+    }
+    for name in ("model", "decision_tree"):
+        try:
+            estimator, compiled = registry.get(name), get_compiled(name)
+        except FileNotFoundError:
+            continue
+        results[f"app.{name}.predict_sklearn"] = measure(lambda x: estimator.predict(x[None, :]), rows)
+        results[f"app.{name}.predict_compiled"] = measure(lambda x: compiled.predict(x[None, :]), rows)
+
+        def grid(x):
+            bhk, bath = int(x[3]), int(x[2])
+            cells = [[x[0], x[1], ba, b]
+                     for b in range(max(1, bhk - 1), min(11, bhk + 2))
+                     for ba in range(max(1, bath - 1), min(11, bath + 2))]
+            return compiled.predict(np.array(cells))
+        results[f"app.{name}.sensitivity_grid"] = measure(grid, rows)
+
+        for size in batch_sizes:
+            chunk = pd.DataFrame(sample_requests(size, seed=size))
+            results[f"bulk.{name}.value_frame[{size}]"] = measure(
+                lambda c: bulk_valuation.value_frame(c, estimator, label_encoder),
+                [chunk] * 5, warmup=1, batch_size=size)
+    return results
+
+
+def bench_agent(requests, concurrency_levels):
+    import agent
+
+    states = [agent._initial_state(details) for details in requests]
+
+    # Advisory input needs a valuation and context; reuse real node outputs
+    with contextlib.redirect_stdout(io.StringIO()):
+        advisory_states = [
+            {**s, **agent.valuation_node(s), **agent.market_research_node(s)} for s in states[:50]
+        ]
+
+    results = {}
+    for c in concurrency_levels:
+        results[f"agent.valuation_node[c={c}]"] = measure(agent.valuation_node, states, c)
+        results[f"agent.market_research_node[c={c}]"] = measure(agent.market_research_node, states, c)
+        results[f"agent.advisory_node[c={c}]"] = measure(agent.advisory_node, advisory_states, c)
+        results[f"agent.get_advisory[c={c}]"] = measure(agent.get_advisory, requests, c)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Print p95/throughput deltas against a baseline; return names that regressed."""
+    regressed = []
+    print(f"\n{'benchmark':58s} {'p95 ms':>10s} {'base':>10s} {'delta':>8s}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        delta = (current["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        flag = ""
+        if delta > max_regression:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:58s} {current['p95_ms']:10.3f} {base['p95_ms']:10.3f} {delta:+8.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmarks")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per benchmark")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                        help="Seconds of simulated generation time in the stub LLM")
+    parser.add_argument('--llm-429-rate', type=float, default=0.0,
+                        help="Fraction of stub LLM calls answered with a 429 (retried by llm_gateway)")
+    parser.add_argument('--llm-quota', type=int,
+                        help="Stub LLM answers 429 above this many concurrent calls")
+    parser.add_argument('--skip-agent', action='store_true', help="Only benchmark the ML inference paths")
+    parser.add_argument('--fake-embeddings', action='store_true',
+                        help="Use deterministic fake embeddings instead of loading all-MiniLM-L6-v2")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', help="Previous results JSON to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="Fail if any p95 is this fraction slower than the baseline")
+    args = parser.parse_args()
+
+    llm.set_llm(llm.StubLLM(latency=args.llm_latency, rate_limit_rate=args.llm_429_rate,
+                            concurrency_limit=args.llm_quota))
+    if args.fake_embeddings:
+        import vector_store
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        vector_store._embeddings = vector_store.CachedEmbeddings(DeterministicFakeEmbedding(size=384))
+
+    requests = sample_requests(args.requests)
+    try:
+        results = bench_inference(requests, args.batch_sizes)
+        if not args.skip_agent:
+            results.update(bench_agent(requests, args.concurrency))
+    except BenchmarkFailed as e:
+        print(f"Benchmark failed, nothing written: {e}")
+        sys.exit(1)
+        from llm_gateway import get_gateway
+        print(f"LLM gateway: {get_gateway().stats}")
+
+    print(f"{'benchmark':58s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>10s}")
+    for name, r in results.items():
+        print(f"{name:58s} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} {r['requests_per_sec']:10.1f}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "artifacts": {name: s["sha256"][:12] for name, s in registry.stats().items()},
+        },
+        "results": results,
+    }
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(results, baseline, args.max_regression)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
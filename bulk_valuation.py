@@ -0,0 +1,184 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from location_index import UNKNOWN, index_for
+from model_registry import registry
+
+FEATURES = ['location', 'total_sqft', 'bath', 'bhk']
+# Same fallbacks valuation_node uses when a field is missing
+DEFAULTS = {'location': 'other', 'total_sqft': 1000, 'bath': 2, 'bhk': 2}
+CHUNK_SIZE = 10000
+
+
+# --- Core ---
+
+def encode_locations(label_encoder, locations):
+    """Integer codes and resolution methods, resolved as valuation_node does.
+
+    Codes are -1 for locations with no exact, alias or fuzzy match that cannot
+    fall back to 'other' (i.e. the encoder was fitted without an 'other' class).
+    """
+    return index_for(label_encoder).encode_batch(locations)
+
+
+def value_frame(frame, model, label_encoder):
+    """Predict prices for every row of `frame` with a single `predict` call.
+
+    Missing fields are filled with DEFAULTS for the model only; the input
+    columns are returned as given, and `imputed` names the fields that were
+    filled for each row.
+    """
+    frame = frame.copy()
+    inputs = {}
+    imputed = pd.Series('', index=frame.index)
+    for col, default in DEFAULTS.items():
+        if col in frame:
+            missing = frame[col].isna().to_numpy()
+            inputs[col] = frame[col].fillna(default)
+        else:
+            missing = np.ones(len(frame), dtype=bool)
+            inputs[col] = pd.Series(default, index=frame.index)
+        imputed += np.where(missing, col + ',', '')
+    imputed = imputed.str.rstrip(',')
+
+    codes, methods = encode_locations(label_encoder, inputs['location'])
+    known = codes != UNKNOWN
+
+    features = np.column_stack([
+        codes,
+        inputs['total_sqft'].to_numpy(dtype=float),
+        inputs['bath'].to_numpy(dtype=float),
+        inputs['bhk'].to_numpy(dtype=float),
+    ])
+
+    prices = np.full(len(frame), np.nan)
+    if known.any():
+        prices[known] = model.predict(features[known])
+
+    frame['predicted_price'] = prices
+    frame['status'] = np.where(known, 'ok', 'unknown_location')
+    frame['location_match'] = methods
+    frame['imputed'] = imputed
+    return frame
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    if path.endswith(('.jsonl', '.ndjson')):
+        return pd.read_json(path, lines=True, chunksize=chunk_size)
+    return pd.read_csv(path, chunksize=chunk_size)
+
+
+def write_chunk(frame, path, first):
+    if path.endswith(('.jsonl', '.ndjson')):
+        frame.to_json(path, orient='records', lines=True, mode='w' if first else 'a')
+    else:
+        frame.to_csv(path, index=False, mode='w' if first else 'a', header=first)
+
+
+def value_portfolio(input_path, output_path, model_name='model', chunk_size=CHUNK_SIZE):
+    """Stream a CSV/JSONL portfolio through the model chunk by chunk."""
+    model = registry.get(model_name)
+    label_encoder = registry.get('label_encoder')
+
+    rows = 0
+    unknown = 0
+    start = time.perf_counter()
+    for i, chunk in enumerate(read_chunks(input_path, chunk_size)):
+        valued = value_frame(chunk, model, label_encoder)
+        write_chunk(valued, output_path, first=(i == 0))
+        rows += len(valued)
+        unknown += int((valued['status'] != 'ok').sum())
+    elapsed = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'unknown_locations': unknown,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+    }
+
+
+# --- Benchmark ---
+
+def predict_row(model, label_encoder, details):
+    # Mirrors the single-row path in valuation_node / app.py
+    loc_encoded = index_for(label_encoder).encode(details.get('location', 'other'))
+    if loc_encoded == UNKNOWN:
+        raise ValueError(f"unknown location {details.get('location')!r}")
+    features = np.array([[
+        loc_encoded,
+        details.get('total_sqft', 1000),
+        details.get('bath', 2),
+        details.get('bhk', 2)
+    ]])
+    return model.predict(features)[0]
+
+
+def benchmark(frame, model, label_encoder):
+    """Time the per-row loop against one vectorized pass and check they agree."""
+    # Empty cells become missing keys, as in a property_details dict
+    records = [
+        {k: v for k, v in row.items() if pd.notna(v)}
+        for row in frame.reindex(columns=FEATURES).to_dict('records')
+    ]
+
+    start = time.perf_counter()
+    row_prices = []
+    for details in records:
+        try:
+            row_prices.append(predict_row(model, label_encoder, details))
+        except ValueError:
+            row_prices.append(np.nan)
+    row_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk_prices = value_frame(frame, model, label_encoder)['predicted_price'].to_numpy()
+    bulk_seconds = time.perf_counter() - start
+
+    row_prices = np.array(row_prices, dtype=float)
+    return {
+        'rows': len(records),
+        'per_row_seconds': row_seconds,
+        'bulk_seconds': bulk_seconds,
+        'speedup': row_seconds / bulk_seconds if bulk_seconds else float('inf'),
+        'identical': bool(np.array_equal(row_prices, bulk_prices, equal_nan=True)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk portfolio valuation")
+    parser.add_argument('input', help="CSV or JSONL with location,total_sqft,bath,bhk")
+    parser.add_argument('output', nargs='?', help="Output CSV/JSONL (default: <input>_valued.<ext>)")
+    parser.add_argument('--model', default='model', choices=['model', 'decision_tree'])
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help="Compare against the per-row loop on the first N rows instead of writing output")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        frame = next(iter(read_chunks(args.input, args.benchmark)))
+        result = benchmark(frame, registry.get(args.model), registry.get('label_encoder'))
+        print(f"Rows: {result['rows']}")
+        print(f"Per-row loop: {result['per_row_seconds']:.3f}s")
+        print(f"Vectorized:   {result['bulk_seconds']:.3f}s ({result['speedup']:.1f}x)")
+        print(f"Identical predictions: {result['identical']}")
+        return
+
+    output = args.output
+    if output is None:
+        root, ext = os.path.splitext(args.input)
+        output = f"{root}_valued{ext}"
+
+    summary = value_portfolio(args.input, output, args.model, args.chunk_size)
+    print(f"Valued {summary['rows']} listings in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_sec']:.0f} rows/s) -> {output}")
+    if summary['unknown_locations']:
+        print(f"Skipped {summary['unknown_locations']} rows with unknown locations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_registry import MODELS_DIR, registry
+
+COMPS_DIR = os.path.join(MODELS_DIR, "comps")
+SPEC_FILE = "spec.json"
+FEATURES = ["total_sqft", "bhk", "bath", "price_per_sqft"]
+PERCENTILES = (10, 25, 50, 75, 90)
+K = 5
+
+# Distance weights: a 10% size difference counts as much as one bedroom
+SQFT_SCALE = 0.1
+BHK_WEIGHT = 1.0
+BATH_WEIGHT = 0.5
+
+
+class CompsIndex:
+    """Real listings grouped by location for nearest-comparable lookups.
+
+    Rows are sorted by (location code, total_sqft) so each location is one
+    contiguous slice found through `offsets`; the arrays are memory-mapped
+    .npy files, so loading is instant and only the slices queried are read.
+    """
+
+    def __init__(self, features, price, offsets, percentiles, spec):
+        self.features = features
+        self.price = price
+        self.offsets = offsets
+        self.percentiles = percentiles
+        self.spec = spec
+
+    @classmethod
+    def load(cls, comps_dir=COMPS_DIR):
+        with open(os.path.join(comps_dir, SPEC_FILE)) as f:
+            spec = json.load(f)
+        arrays = {name: np.load(os.path.join(comps_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in ("features", "price", "offsets", "percentiles")}
+        return cls(spec=spec, **arrays)
+
+    @property
+    def n_locations(self):
+        return len(self.offsets) - 1
+
+    def location_stats(self, loc_encoded):
+        """Listing count and price/sqft percentiles for a location, or None if it has no listings."""
+        if not 0 <= loc_encoded < self.n_locations:
+            return None
+        start, end = self.offsets[loc_encoded], self.offsets[loc_encoded + 1]
+        if start == end:
+            return None
+        return {
+            "count": int(end - start),
+            "price_per_sqft": {f"p{p}": round(float(v), 1)
+                               for p, v in zip(PERCENTILES, self.percentiles[loc_encoded])},
+        }
+
+    def nearest(self, loc_encoded, total_sqft, bhk, bath, k=K):
+        """The k listings in a location closest in size and configuration, nearest first."""
+        if not 0 <= loc_encoded < self.n_locations:
+            return []
+        start, end = int(self.offsets[loc_encoded]), int(self.offsets[loc_encoded + 1])
+        rows = np.asarray(self.features[start:end])
+        if not len(rows):
+            return []
+
+        distance = (np.abs(np.log(rows[:, 0] / max(total_sqft, 1))) / SQFT_SCALE
+                    + BHK_WEIGHT * np.abs(rows[:, 1] - bhk)
+                    + BATH_WEIGHT * np.abs(rows[:, 2] - bath))
+        k = min(k, len(rows))
+        nearest = np.argpartition(distance, k - 1)[:k]
+        nearest = nearest[np.lexsort((rows[nearest, 0], distance[nearest]))]
+        return [
+            {
+                "total_sqft": float(rows[i, 0]),
+                "bhk": int(rows[i, 1]),
+                "bath": int(rows[i, 2]),
+                "price_per_sqft": round(float(rows[i, 3]), 1),
+                "price": round(float(self.price[start + i]), 2),
+            }
+            for i in nearest
+        ]
+
+    def query(self, loc_encoded, total_sqft, bhk, bath, k=K):
+        stats = self.location_stats(loc_encoded)
+        if stats is None:
+            return None
+        return {**stats, "listings": self.nearest(loc_encoded, total_sqft, bhk, bath, k)}
+
+
+def build_comps(frame, n_locations, label_encoder_version, comps_dir=COMPS_DIR):
+    """Write the comps arrays from a cleaned frame whose `location` is already label-encoded."""
+    start = time.perf_counter()
+    frame = frame.sort_values(["location", "total_sqft"], kind="stable")
+    codes = frame["location"].to_numpy(dtype=np.int64)
+
+    features = frame[FEATURES].to_numpy(dtype=np.float32)
+    price = frame["price"].to_numpy(dtype=np.float32)
+    offsets = np.searchsorted(codes, np.arange(n_locations + 1)).astype(np.int64)
+    percentiles = np.full((n_locations, len(PERCENTILES)), np.nan, dtype=np.float32)
+    for loc in np.flatnonzero(np.diff(offsets)):
+        percentiles[loc] = np.percentile(features[offsets[loc]:offsets[loc + 1], 3], PERCENTILES)
+
+    # Written to a sibling directory and swapped in, so readers never see a mix
+    os.makedirs(os.path.dirname(os.path.abspath(comps_dir)), exist_ok=True)
+    tmp = comps_dir.rstrip(os.sep) + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for name, array in (("features", features), ("price", price),
+                        ("offsets", offsets), ("percentiles", percentiles)):
+        np.save(os.path.join(tmp, f"{name}.npy"), array)
+    spec = {"label_encoder": label_encoder_version, "features": FEATURES,
+            "percentiles": list(PERCENTILES), "rows": len(frame), "locations": n_locations}
+    with open(os.path.join(tmp, SPEC_FILE), "w") as f:
+        json.dump(spec, f)
+
+    if os.path.isdir(comps_dir):
+        old = comps_dir.rstrip(os.sep) + ".old"
+        os.replace(comps_dir, old)
+        os.replace(tmp, comps_dir)
+        for name in os.listdir(old):
+            os.remove(os.path.join(old, name))
+        os.rmdir(old)
+    else:
+        os.replace(tmp, comps_dir)
+
+    print(f"Built comps index: {len(frame)} listings over {n_locations} locations "
+          f"in {time.perf_counter() - start:.2f}s -> {comps_dir}")
+    return spec
+
+
+# --- Lookup for the agent and app ---
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_comps_index():
+    """Comps for the currently loaded label encoder, or None if not built (or built for another encoder).
+
+    Keyed on spec.json's stat as well as the encoder version, so an index
+    built or rebuilt by `python comps.py` while the app runs is picked up
+    on the next lookup; a missing index is re-checked every time.
+    """
+    global _index
+    try:
+        version = registry.version('label_encoder')
+        stat = os.stat(os.path.join(COMPS_DIR, SPEC_FILE))
+    except FileNotFoundError:
+        return None
+    # The rebuild swaps in a new directory, so the inode changes even when
+    # the mtime does not
+    stamp = (version, stat.st_mtime_ns, stat.st_ino)
+    cached = _index
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with _lock:
+        try:
+            index = CompsIndex.load()
+        except FileNotFoundError:
+            return None  # swapped out mid-load; the next lookup retries
+        if index.spec["label_encoder"] != version:
+            print(f"Comps index was built for label encoder {index.spec['label_encoder']}, "
+                  f"not {version}; rebuild with `python comps.py`")
+            index = None
+        _index = (stamp, index)
+        return index
+
+
+def main():
+    import pandas as pd
+
+    from train import DATA_PATH, clean, remove_pps_outliers
+
+    parser = argparse.ArgumentParser(description="Build the comparable-listings index for the current models")
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args()
+
+    label_encoder = registry.get('label_encoder')
+    df = remove_pps_outliers(clean(pd.read_csv(args.data)))
+    known = df['location'].isin(label_encoder.classes_)
+    if not known.all():
+        print(f"Dropping {int((~known).sum())} listings in locations the encoder has not seen")
+    df = df[known].assign(location=lambda d: label_encoder.transform(d['location']))
+    build_comps(df, len(label_encoder.classes_), registry.version('label_encoder'))
+
+
+if __name__ == "__main__":
+    main()
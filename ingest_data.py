@@ -1,8 +1,12 @@
+import argparse
+import csv
+import hashlib
+import json
 import os
+import time
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.documents import Document
 from dotenv import load_dotenv
+from vector_store import EMBEDDING_MODEL, PERSIST_DIRECTORY, get_embeddings, write_corpus_version
 
 load_dotenv()
 
@@ -38,26 +42,166 @@ MARKET_DATA = [
     }
 ]
 
-def ingest():
-    # Use localized HuggingFace embeddings (all-MiniLM-L6-v2 is small and fast)
-    print("Loading HuggingFace embeddings (all-MiniLM-L6-v2)...")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    docs = [
-        Document(page_content=item["content"], metadata={"location": item["location"]})
-        for item in MARKET_DATA
-    ]
-    
-    print(f"Ingesting {len(docs)} documents into ChromaDB...")
-    
-    # Save to disk (overwrite existing)
-    vectorstore = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory="./chroma_db"
-    )
-    
-    print("Ingestion complete. Vector store saved to ./chroma_db")
+# Supported corpus file types
+SUFFIXES = ('.jsonl', '.csv', '.md')
+BATCH_SIZE = 32
+
+
+# --- Corpus loading ---
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _read_markdown(path):
+    # One document per "## Heading" section (heading = location); a file
+    # without sections is a single document named after the file.
+    stem = os.path.splitext(os.path.basename(path))[0]
+    location, lines = stem, []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('## '):
+                if ''.join(lines).strip():
+                    yield {"location": location, "content": ''.join(lines).strip()}
+                location, lines = line[3:].strip(), []
+            elif not line.startswith('# '):
+                lines.append(line)
+    if ''.join(lines).strip():
+        yield {"location": location, "content": ''.join(lines).strip()}
+
+
+def load_documents(paths=None):
+    """Stream {"location", "content", ...} records from JSONL/CSV/Markdown files.
+
+    With no paths, yields the built-in MARKET_DATA.
+    """
+    if not paths:
+        for item in MARKET_DATA:
+            yield {**item, "source": "builtin"}
+        return
+
+    for path in iter_files(paths):
+        if path.endswith('.jsonl'):
+            with open(path, encoding='utf-8') as f:
+                records = (json.loads(line) for line in f if line.strip())
+                for item in records:
+                    yield {**item, "source": path}
+        elif path.endswith('.csv'):
+            with open(path, encoding='utf-8', newline='') as f:
+                for item in csv.DictReader(f):
+                    yield {**item, "source": path}
+        elif path.endswith('.md'):
+            for item in _read_markdown(path):
+                yield {**item, "source": path}
+        else:
+            print(f"Skipping unsupported file: {path}")
+
+
+def _metadata(item):
+    return {
+        k: v for k, v in item.items()
+        if k != 'content' and isinstance(v, (str, int, float, bool)) and v != ''
+    }
+
+
+def doc_id(item):
+    """Stable ID from the document's content and stored metadata, so unchanged
+    documents keep their ID and metadata-only edits (e.g. new `aliases`) are
+    written. `source` is left out, so moving a file does not re-embed it."""
+    key = f"{item.get('location', '')}\x1f{item['content']}"
+    extra = {k: v for k, v in _metadata(item).items() if k not in ('location', 'source')}
+    if extra:
+        key += "\x1f" + json.dumps(extra, sort_keys=True, default=str)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+# --- Ingestion ---
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest(paths=None, batch_size=BATCH_SIZE, persist_directory=PERSIST_DIRECTORY):
+    """Sync the Chroma store with the corpus.
+
+    Only documents whose content/metadata hash is not already stored are embedded
+    (in batches) and upserted; stored documents no longer in the corpus are
+    deleted. Re-running on an unchanged corpus embeds nothing.
+    """
+    print(f"Loading HuggingFace embeddings ({EMBEDDING_MODEL})...")
+    embeddings = get_embeddings()
+    vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    collection = vectorstore._collection
+
+    existing = set(collection.get(include=[])['ids'])
+    seen = set()
+
+    def pending():
+        for item in load_documents(paths):
+            item_id = doc_id(item)
+            if item_id in seen:
+                continue  # duplicate within the corpus
+            seen.add(item_id)
+            if item_id not in existing:
+                yield item_id, item
+
+    added = 0
+    start = time.perf_counter()
+    for i, batch in enumerate(_batches(pending(), batch_size)):
+        ids = [item_id for item_id, _ in batch]
+        texts = [item['content'] for _, item in batch]
+
+        t0 = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        embed_seconds = time.perf_counter() - t0
+
+        collection.upsert(ids=ids, embeddings=vectors, documents=texts,
+                          metadatas=[_metadata(item) for _, item in batch])
+        added += len(batch)
+        print(f"Batch {i + 1}: embedded {len(batch)} docs in {embed_seconds:.2f}s "
+              f"({len(batch) / embed_seconds if embed_seconds else float('inf'):.1f} docs/s)")
+
+    stale = sorted(existing - seen)
+    if stale:
+        collection.delete(ids=stale)
+    # Lets running agents know their cached location index/general context is stale
+    write_corpus_version(persist_directory, seen)
+
+    summary = {
+        "documents": len(seen),
+        "added": added,
+        "unchanged": len(seen) - added,
+        "deleted": len(stale),
+        "seconds": time.perf_counter() - start,
+    }
+    print(f"Ingestion complete: {summary['added']} added, {summary['unchanged']} unchanged, "
+          f"{summary['deleted']} deleted ({summary['documents']} documents in {persist_directory})")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync market documents into ChromaDB")
+    parser.add_argument('paths', nargs='*',
+                        help="JSONL/CSV/Markdown files or directories (default: built-in MARKET_DATA)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--persist-directory', default=PERSIST_DIRECTORY)
+    args = parser.parse_args()
+    ingest(args.paths, args.batch_size, args.persist_directory)
+
 
 if __name__ == "__main__":
-    ingest()
+    main()
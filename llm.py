@@ -0,0 +1,155 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_TEMPERATURE = 0.1
+# Upper bound on one HTTP call; llm_gateway passes a tighter per-call
+# timeout derived from its deadline
+LLM_TIMEOUT = 60.0
+
+
+class StubRateLimitError(Exception):
+    """What StubLLM raises in place of a provider's HTTP 429."""
+
+    status_code = 429
+
+    def __init__(self, message="Rate limit reached (stub)", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class StubTimeoutError(TimeoutError):
+    """What StubLLM raises when `latency` exceeds the caller's timeout."""
+
+
+class StubLLM:
+    """Local stand-in for ChatGroq so the graph and cache can run offline.
+
+    Produces a deterministic report echoing the property details from the
+    prompt, optionally after an artificial delay. It can also answer with
+    429s: at random (`rate_limit_rate`) or whenever more than
+    `concurrency_limit` calls are in flight, like a provider's quota. A
+    `timeout` shorter than `latency` behaves like a stalled connection
+    timing out.
+    """
+
+    model_name = "stub"
+
+    def __init__(self, latency=0.0, rate_limit_rate=0.0, concurrency_limit=None, retry_after=None, seed=0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.concurrency_limit = concurrency_limit
+        self.retry_after = retry_after
+        self.calls = 0
+        self.rate_limited = 0
+        self.active = 0
+        self.max_active = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _request(self):
+        with self._lock:
+            limited = ((self.concurrency_limit is not None and self.active >= self.concurrency_limit)
+                       or self._random.random() < self.rate_limit_rate)
+            if limited:
+                self.rate_limited += 1
+                raise StubRateLimitError(retry_after=self.retry_after)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _report(self, prompt):
+        with self._lock:
+            self.calls += 1
+        details = re.findall(r"^\s*- (.+)$", str(prompt), flags=re.MULTILINE)
+        lines = "\n".join(f"- {d}" for d in details[:4]) or "- (no property details)"
+        return (
+            "## SUMMARY\nOffline stub report for:\n"
+            f"{lines}\n\n"
+            "## COMPS\nNo live model was called; comparables are not available.\n\n"
+            "## ACTION\nHold — generated by the local stub LLM.\n\n"
+            "## DISCLAIMER\nThis is placeholder output for testing, not financial advice."
+        )
+
+    def _timed_out(self, timeout):
+        return timeout is not None and self.latency > timeout
+
+    def invoke(self, prompt, timeout=None):
+        with self._request():
+            if self._timed_out(timeout):
+                time.sleep(timeout)
+                raise StubTimeoutError(f"Request timed out after {timeout:.2f}s (stub)")
+            if self.latency:
+                time.sleep(self.latency)
+            return AIMessage(content=self._report(prompt))
+
+    async def ainvoke(self, prompt, timeout=None):
+        with self._request():
+            if self._timed_out(timeout):
+                await asyncio.sleep(timeout)
+                raise StubTimeoutError(f"Request timed out after {timeout:.2f}s (stub)")
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return AIMessage(content=self._report(prompt))
+
+    def stream(self, prompt, timeout=None):
+        # Word-sized chunks, with the latency spread across them
+        with self._request():
+            if self._timed_out(timeout):
+                time.sleep(timeout)
+                raise StubTimeoutError(f"Request timed out after {timeout:.2f}s (stub)")
+            words = re.split(r"(?<=\s)", self._report(prompt))
+            for word in words:
+                if self.latency:
+                    time.sleep(self.latency / len(words))
+                yield AIMessageChunk(content=word)
+
+
+_lock = threading.Lock()
+_llm = None
+
+
+def get_llm():
+    """Process-wide LLM client, created on first use.
+
+    ADVISOR_LLM selects the backend: "groq" (default) or "stub" for the
+    offline, deterministic stand-in.
+    """
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                if os.getenv("ADVISOR_LLM", "groq") == "stub":
+                    _llm = StubLLM()
+                else:
+                    from langchain_groq import ChatGroq
+                    # Retries and backoff are handled by llm_gateway, not the SDK.
+                    # Without a timeout the SDK waits on a stalled connection forever.
+                    _llm = ChatGroq(model_name=LLM_MODEL, temperature=LLM_TEMPERATURE,
+                                    max_retries=0, timeout=LLM_TIMEOUT)
+    return _llm
+
+
+def set_llm(llm):
+    """Swap in any object with invoke/ainvoke/stream taking a `timeout` keyword
+    (e.g. StubLLM) for tests and benchmarks."""
+    global _llm
+    with _lock:
+        _llm = llm
+
+
+def llm_id(llm=None):
+    llm = llm or get_llm()
+    return getattr(llm, "model_name", type(llm).__name__)
@@ -0,0 +1,357 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from llm import get_llm, llm_id
+from telemetry import metrics
+
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 3
+BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+DEADLINE = 60.0
+# How often a waiting coroutine re-checks for a free slot
+ASYNC_POLL = 0.005
+
+
+class LLMUnavailable(Exception):
+    """The call could not be completed: retries exhausted or the deadline passed."""
+
+
+class DeadlineExceeded(LLMUnavailable, TimeoutError):
+    pass
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def is_retryable(error):
+    """429s, provider 5xx, and connection errors/timeouts are worth another try."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout")
+
+
+def _retry_after(error):
+    seconds = getattr(error, "retry_after", None)
+    if seconds is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        seconds = headers.get("retry-after")
+    try:
+        return float(seconds) if seconds is not None else None
+    except ValueError:
+        return None
+
+
+class _Broadcast:
+    """Chunks of one upstream stream, replayable by any number of subscribers."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def put(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def close(self, error=None):
+        with self._cond:
+            self.finished = True
+            self.error = error
+            self._cond.notify_all()
+
+    def subscribe(self, deadline_at):
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self.chunks) and not self.finished:
+                    remaining = deadline_at - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("LLM deadline reached waiting for the stream")
+                    self._cond.wait(remaining)
+                new, finished, error = self.chunks[sent:], self.finished, self.error
+            sent += len(new)
+            yield from new
+            if finished:
+                if error is None:
+                    return
+                if not isinstance(error, Exception):
+                    raise LLMUnavailable("LLM stream was interrupted")
+                raise error
+
+
+class LLMGateway:
+    """Every outbound LLM call goes through here.
+
+    - one shared client (llm.get_llm(), looked up per call so set_llm works)
+    - single-flight: identical prompts in flight at the same time, from
+      threads or coroutines, share one provider call and its result (or,
+      for streams, its chunks)
+    - at most `max_concurrency` provider calls at once; the rest wait
+    - retries on 429/5xx with jittered exponential backoff (honouring
+      Retry-After), all within a per-call deadline; each provider call is
+      given only the time left before it, so a stalled connection cannot
+      hold a slot past the deadline
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF, deadline=DEADLINE):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.stats = {"calls": 0, "deduplicated": 0, "retries": 0, "failures": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+        metrics.inc("llm_gateway_total", n, event=name)
+
+    def _delay(self, attempt, error):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * (0.5 + self._random.random() / 2)
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    @staticmethod
+    def _key(prompt, kind="invoke"):
+        return hashlib.sha256(f"{kind}\n{llm_id()}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _join_or_lead(self, key, make=Future):
+        """(flight, is_leader): the in-flight call for this key, or a new one to run."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._inflight[key] = make()
+            return flight, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if future.done():
+            return
+        if error is not None and not isinstance(error, Exception):
+            # The leader was cancelled or interrupted; the followers should
+            # fall back like any other failed call, not be cancelled with it
+            error = LLMUnavailable("identical LLM call was cancelled")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _check_retry(self, attempt, error, deadline_at):
+        """Seconds to wait before the next attempt, or raise if there should not be one."""
+        reason = str(error) or type(error).__name__
+        if not is_retryable(error) or attempt >= self.max_retries:
+            self._count("failures")
+            if is_retryable(error):
+                raise LLMUnavailable(f"LLM call failed after {attempt + 1} attempts: {reason}") from error
+            raise error
+        delay = self._delay(attempt, error)
+        if time.monotonic() + delay >= deadline_at:
+            self._count("failures")
+            raise DeadlineExceeded(f"LLM deadline reached after {attempt + 1} attempts: {reason}") from error
+        self._count("retries")
+        return delay
+
+    def _remaining(self, deadline_at):
+        """Timeout for the next provider call: whatever is left of the deadline."""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            self._count("failures")
+            raise DeadlineExceeded("LLM deadline reached before the call could start")
+        return remaining
+
+    def _acquire(self, deadline_at):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=max(0.0, deadline_at - time.monotonic())):
+            self._count("failures")
+            raise DeadlineExceeded("LLM deadline reached waiting for a free slot")
+        metrics.observe("llm_gateway_wait_seconds", time.perf_counter() - start)
+
+    # --- Sync ---
+
+    def invoke(self, prompt, deadline=None):
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        key = self._key(prompt)
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            self._count("deduplicated")
+            try:
+                return future.result(timeout=max(0.0, deadline_at - time.monotonic()))
+            except TimeoutError:
+                raise DeadlineExceeded("LLM deadline reached waiting for an identical call")
+
+        try:
+            result = self._call(prompt, deadline_at)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def _call(self, prompt, deadline_at):
+        attempt = 0
+        while True:
+            self._acquire(deadline_at)
+            try:
+                timeout = self._remaining(deadline_at)
+                self._count("calls")
+                return get_llm().invoke(prompt, timeout=timeout)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                self._slots.release()
+            time.sleep(self._check_retry(attempt, error, deadline_at))
+            attempt += 1
+
+    def stream(self, prompt, deadline=None):
+        """Stream chunks; rate limits before the first chunk are retried.
+
+        Identical prompts streamed at the same time share one upstream call:
+        it runs on its own thread into a buffer, and every caller (including
+        late joiners) replays the buffered chunks and then follows along.
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        key = self._key(prompt, kind="stream")
+        broadcast, leader = self._join_or_lead(key, _Broadcast)
+        if leader:
+            # copy_context keeps the caller's trace id on the upstream thread
+            threading.Thread(target=contextvars.copy_context().run, name="llm-stream", daemon=True,
+                             args=(self._pump, key, broadcast, prompt, deadline_at)).start()
+        else:
+            self._count("deduplicated")
+        yield from broadcast.subscribe(deadline_at)
+
+    def _pump(self, key, broadcast, prompt, deadline_at):
+        try:
+            for chunk in self._stream(prompt, deadline_at):
+                broadcast.put(chunk)
+        except BaseException as e:
+            broadcast.close(e)
+        else:
+            broadcast.close()
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _stream(self, prompt, deadline_at):
+        attempt = 0
+        while True:
+            self._acquire(deadline_at)
+            started = False
+            try:
+                timeout = self._remaining(deadline_at)
+                self._count("calls")
+                for chunk in get_llm().stream(prompt, timeout=timeout):
+                    started = True
+                    yield chunk
+                return
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+            finally:
+                self._slots.release()
+            time.sleep(self._check_retry(attempt, error, deadline_at))
+            attempt += 1
+
+    # --- Async ---
+
+    async def ainvoke(self, prompt, deadline=None):
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        key = self._key(prompt)
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            self._count("deduplicated")
+            try:
+                # shield: a follower timing out or being cancelled must not
+                # cancel the shared future the leader and others wait on
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                              max(0.0, deadline_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("LLM deadline reached waiting for an identical call")
+
+        try:
+            result = await self._acall(prompt, deadline_at)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def _aacquire(self, deadline_at):
+        # The slots are shared with threaded callers, so poll the threading
+        # semaphore instead of blocking the event loop on it
+        start = time.perf_counter()
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= deadline_at:
+                self._count("failures")
+                raise DeadlineExceeded("LLM deadline reached waiting for a free slot")
+            await asyncio.sleep(ASYNC_POLL)
+        metrics.observe("llm_gateway_wait_seconds", time.perf_counter() - start)
+
+    async def _acall(self, prompt, deadline_at):
+        attempt = 0
+        while True:
+            await self._aacquire(deadline_at)
+            try:
+                timeout = self._remaining(deadline_at)
+                self._count("calls")
+                # wait_for also bounds clients that ignore the timeout argument;
+                # its TimeoutError is retryable, and _check_retry turns it into
+                # DeadlineExceeded once no time is left
+                return await asyncio.wait_for(get_llm().ainvoke(prompt, timeout=timeout), timeout)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                self._slots.release()
+            await asyncio.sleep(self._check_retry(attempt, error, deadline_at))
+            attempt += 1
+
+
+_gateway = None
+_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide gateway; LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES and LLM_DEADLINE override the defaults."""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = LLMGateway(
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", MAX_CONCURRENCY)),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", MAX_RETRIES)),
+                    deadline=float(os.getenv("LLM_DEADLINE", DEADLINE)),
+                )
+    return _gateway
+
+
+def set_gateway(gateway):
+    global _gateway
+    with _lock:
+        _gateway = gateway
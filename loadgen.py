@@ -0,0 +1,100 @@
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Same defaults as service.py, without importing the model/agent stack
+LOG_PATH = os.path.join("logs", "requests.jsonl")
+URL = "http://127.0.0.1:8000"
+
+
+def read_log(path, paths=None, limit=None):
+    """Requests recorded by service.py, in arrival order."""
+    records = []
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("req") is None or (paths and record["path"] not in paths):
+                continue
+            records.append(record)
+            if limit and len(records) >= limit:
+                break
+    return records
+
+
+def send(base_url, path, payload, timeout):
+    request = urllib.request.Request(base_url + path, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, http.client.HTTPException, OSError):
+        status = 0  # connection refused/reset or timed out
+    return status, time.perf_counter() - start
+
+
+def replay(records, base_url, concurrency=8, speed=0.0, timeout=130.0):
+    """Send every record; with speed > 0, keep the log's inter-arrival gaps divided by `speed`.
+
+    Returns per-path latency lists and status counts.
+    """
+    results = {}
+    lock = threading.Lock()
+
+    def fire(record):
+        status, seconds = send(base_url, record["path"], record["req"], timeout)
+        with lock:
+            path = results.setdefault(record["path"], {"latencies": [], "statuses": {}})
+            path["latencies"].append(seconds)
+            path["statuses"][status] = path["statuses"].get(status, 0) + 1
+
+    start = time.perf_counter()
+    t0 = records[0]["t"] if records else 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            if speed > 0:
+                delay = (record["t"] - t0) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(fire, record)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a service.py request log against a running service")
+    parser.add_argument('log', nargs='?', default=LOG_PATH)
+    parser.add_argument('--url', default=URL)
+    parser.add_argument('--paths', nargs='+', help="Only replay these endpoints, e.g. /value")
+    parser.add_argument('--limit', type=int, help="Replay at most this many requests")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="Replay at N x the recorded rate (0 = as fast as possible)")
+    parser.add_argument('--repeat', type=int, default=1, help="Send the log this many times")
+    args = parser.parse_args()
+
+    if args.speed > 0 and args.repeat > 1:
+        parser.error("--repeat only works with --speed 0")
+    records = read_log(args.log, args.paths, args.limit) * args.repeat
+    print(f"Replaying {len(records)} requests from {args.log} against {args.url}")
+
+    results, wall = replay(records, args.url.rstrip("/"), args.concurrency, args.speed)
+    print(f"\n{'path':10s} {'n':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>9s}  statuses")
+    for path, r in sorted(results.items()):
+        ms = np.asarray(r["latencies"]) * 1000
+        print(f"{path:10s} {len(ms):7d} {np.percentile(ms, 50):9.2f} {np.percentile(ms, 95):9.2f} "
+              f"{np.percentile(ms, 99):9.2f} {len(ms) / wall:9.1f}  {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
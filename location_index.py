@@ -0,0 +1,119 @@
+import difflib
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from model_registry import registry
+
+OTHER = "other"
+# difflib ratio on normalized names; "Whitefeild" -> "Whitefield" scores 0.9
+FUZZY_CUTOFF = 0.85
+FUZZY_CACHE_SIZE = 4096
+UNKNOWN = -1
+
+
+def normalize_location(name):
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(name).casefold()).split())
+
+
+class LocationIndex:
+    """Location name -> label code lookups for one fitted LabelEncoder.
+
+    Built once per encoder: an exact dict over `classes_`, normalized and
+    space-free aliases ("HSR layout" / "hsr-layout" / "HSRLayout"), and a
+    difflib matcher for typos whose results are memoised.
+    """
+
+    def __init__(self, classes):
+        self.classes = [str(c) for c in classes]
+        self.codes = {name: code for code, name in enumerate(self.classes)}
+        self.by_key = {}
+        self.by_compact = {}
+        for code, name in enumerate(self.classes):
+            key = normalize_location(name)
+            # classes_ is sorted, so the first spelling of a duplicate key wins
+            self.by_key.setdefault(key, code)
+            self.by_compact.setdefault(key.replace(" ", ""), code)
+        self._keys = list(self.by_key)
+        self.other = self.codes.get(OTHER, UNKNOWN)
+        self._fuzzy = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fuzzy_match(self, key):
+        with self._lock:
+            if key in self._fuzzy:
+                self._fuzzy.move_to_end(key)
+                return self._fuzzy[key]
+        match = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        code = self.by_key[match[0]] if match else None
+        with self._lock:
+            self._fuzzy[key] = code
+            while len(self._fuzzy) > FUZZY_CACHE_SIZE:
+                self._fuzzy.popitem(last=False)
+        return code
+
+    def resolve(self, name):
+        """(code, method, matched class name) for one location.
+
+        method is "exact", "alias", "fuzzy", "other" (fell back to the 'other'
+        class) or "unknown" (code is -1: no match and no 'other' class).
+        """
+        code = self.codes.get(name)
+        if code is not None:
+            return code, "exact", self.classes[code]
+        key = normalize_location(name)
+        code = self.by_key.get(key)
+        if code is None:
+            code = self.by_compact.get(key.replace(" ", ""))
+        if code is not None:
+            return code, "alias", self.classes[code]
+        code = self._fuzzy_match(key) if key else None
+        if code is not None:
+            return code, "fuzzy", self.classes[code]
+        if self.other != UNKNOWN:
+            return self.other, "other", OTHER
+        return UNKNOWN, "unknown", None
+
+    def encode(self, name):
+        return self.resolve(name)[0]
+
+    def encode_batch(self, names):
+        """Codes and resolution methods for many names.
+
+        Exact names are matched in one vectorized lookup; only the distinct
+        misses go through alias/fuzzy resolution.
+        """
+        names = pd.Series(names, dtype=object)
+        codes = pd.Index(self.classes).get_indexer(names)
+        methods = np.full(len(names), "exact", dtype=object)
+        missing = codes == UNKNOWN
+        if missing.any():
+            resolved = {name: self.resolve(name) for name in pd.unique(names[missing])}
+            codes[missing] = [resolved[name][0] for name in names[missing]]
+            methods[missing] = [resolved[name][1] for name in names[missing]]
+        return codes, methods
+
+
+_indexes = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def index_for(label_encoder):
+    """The LocationIndex for a fitted encoder, built on first use."""
+    index = _indexes.get(label_encoder)
+    if index is None:
+        with _lock:
+            index = _indexes.get(label_encoder)
+            if index is None:
+                index = _indexes[label_encoder] = LocationIndex(label_encoder.classes_)
+    return index
+
+
+def get_location_index():
+    # The registry hands out a new encoder object when label_encoder.pkl
+    # changes, so this follows retrains without a version check of its own
+    return index_for(registry.get('label_encoder'))
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+MODELS_DIR = "models"
+# Written by train.py after all the artifacts, with their sha256s
+METADATA_FILE = "metadata.json"
+
+# Logical artifact names -> file names inside MODELS_DIR
+ARTIFACTS = {
+    "model": "trained_model.pkl",
+    "decision_tree": "decision_tree_model.pkl",
+    "label_encoder": "label_encoder.pkl",
+    "columns": "columns.pkl",
+}
+
+
+@dataclass(frozen=True)
+class ArtifactEntry:
+    obj: object
+    path: str
+    signature: tuple  # (mtime_ns, size) of the file the object was loaded from
+    sha256: str
+    file_bytes: int
+    load_seconds: float
+    memory_bytes: int
+    loaded_at: float
+
+
+class ModelRegistry:
+    """Process-wide cache of unpickled model artifacts.
+
+    Every `get` stats the artifact and metadata.json; the file is only
+    re-read when its mtime/size changes, and only re-unpickled when its
+    content hash changes.
+
+    train.py writes the artifacts one by one and then metadata.json listing
+    their hashes. A new file is only swapped in once metadata.json lists it,
+    so while training is still writing, readers keep the previous set and a
+    new forest is never paired with the old label encoder. (Without
+    hashes in metadata.json, each file is swapped in as soon as it changes.)
+    """
+
+    def __init__(self, models_dir=MODELS_DIR):
+        self.models_dir = models_dir
+        self._entries = {}
+        self._checked = {}  # name -> (file, metadata) signatures already verified
+        self._manifest = (None, {})  # (metadata.json signature, {name: sha256})
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.models_dir, ARTIFACTS.get(name, name))
+
+    def get(self, name):
+        """Return the loaded artifact, reloading it if the file changed on disk.
+
+        Raises FileNotFoundError if the artifact does not exist.
+        """
+        return self.entry(name).obj
+
+    def entry(self, name):
+        path = self.path(name)
+        check = (_signature(path), _signature(os.path.join(self.models_dir, METADATA_FILE), missing=None))
+
+        entry = self._entries.get(name)
+        if entry is not None and self._checked.get(name) == check:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and self._checked.get(name) == check:
+                return entry
+            expected = self._expected(check[1]).get(name)
+
+            if entry is not None and entry.signature == check[0]:
+                data, digest = None, entry.sha256
+            else:
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+
+            if entry is not None and digest != expected and entry.sha256 == expected:
+                # A new file not yet listed in metadata.json: training is
+                # still writing the set, keep serving the previous one
+                pass
+            elif entry is not None and entry.sha256 == digest:
+                # File was touched/rewritten with identical bytes: keep the object
+                entry = replace(entry, signature=check[0])
+            else:
+                if expected is not None and digest != expected:
+                    print(f"Warning: {path} does not match {METADATA_FILE}; loading it anyway")
+                entry = _load(path, data, check[0], digest)
+                print(f"Loaded {path} in {entry.load_seconds * 1000:.1f} ms "
+                      f"(~{entry.memory_bytes / 1e6:.1f} MB)")
+            self._entries[name] = entry
+            self._checked[name] = check
+            return entry
+
+    def _expected(self, signature):
+        """{name: sha256} from metadata.json, re-read only when it changes."""
+        if self._manifest[0] != signature:
+            hashes = {}
+            if signature is not None:
+                try:
+                    with open(os.path.join(self.models_dir, METADATA_FILE)) as f:
+                        hashes = json.load(f).get("artifacts", {})
+                except (OSError, ValueError):
+                    pass
+            self._manifest = (signature, hashes)
+        return self._manifest[1]
+
+    def version(self, name):
+        """Short content hash of the currently loaded artifact."""
+        return self.entry(name).sha256[:12]
+
+    def stats(self):
+        """Load time and memory footprint for every artifact loaded so far."""
+        return {
+            name: {
+                "path": entry.path,
+                "sha256": entry.sha256,
+                "file_bytes": entry.file_bytes,
+                "load_seconds": entry.load_seconds,
+                "memory_bytes": entry.memory_bytes,
+                "loaded_at": entry.loaded_at,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._checked = {}
+            self._manifest = (None, {})
+
+
+_MISSING = object()
+
+
+def _signature(path, missing=_MISSING):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        if missing is _MISSING:
+            raise
+        return missing
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load(path, data, signature, digest):
+    start = time.perf_counter()
+    obj = pickle.loads(data)
+    load_seconds = time.perf_counter() - start
+
+    return ArtifactEntry(
+        obj=obj,
+        path=path,
+        signature=signature,
+        sha256=digest,
+        file_bytes=len(data),
+        load_seconds=load_seconds,
+        memory_bytes=_footprint(obj),
+        loaded_at=time.time(),
+    )
+
+
+def _footprint(obj):
+    # Approximate deep size. sklearn estimators (and the Cython Tree objects
+    # inside them) expose their ndarray buffers through __getstate__, so the
+    # walk picks up the node/value arrays that make up most of a model.
+    seen = {}  # id -> object; holding the object keeps temporary state dicts alive
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen[id(o)] = o
+
+        if isinstance(o, np.ndarray):
+            total += o.nbytes
+            if o.dtype == object:
+                stack.extend(o.ravel())
+            continue
+
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            try:
+                state = o.__getstate__()
+            except Exception:
+                state = getattr(o, "__dict__", None)
+            if state is not None:
+                stack.append(state)
+    return total
+
+
+# Shared by agent.py and app.py
+registry = ModelRegistry()
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_registry import registry
+
+SURFACES_DIR = os.path.join("models", "surfaces")
+
+# Grid matches the app's inputs: sqft in 50-sqft steps over the number_input
+# range, and the common BHK/Bath configurations (larger ones fall back to
+# live inference).
+SQFT_MIN, SQFT_MAX, SQFT_STEP = 300, 10000, 50
+BHK_MAX = 6
+BATH_MAX = 6
+
+
+class PriceSurface:
+    """Precomputed predictions over (location, sqft bucket, bhk, bath) for one model version.
+
+    Stored as a float32 .npy and memory-mapped, so only the pages for
+    locations actually looked at are read into memory.
+    """
+
+    def __init__(self, prices, spec):
+        self.prices = prices
+        self.spec = spec
+        self.sqft_min, self.sqft_max, self.sqft_step = spec["sqft"]
+        self.bhk_max = spec["bhk_max"]
+        self.bath_max = spec["bath_max"]
+
+    @staticmethod
+    def path(model_name, version, surfaces_dir=SURFACES_DIR):
+        return os.path.join(surfaces_dir, f"{model_name}-{version}.npy")
+
+    @classmethod
+    def load(cls, model_name, version, surfaces_dir=SURFACES_DIR):
+        path = cls.path(model_name, version, surfaces_dir)
+        with open(path[:-4] + ".json") as f:
+            spec = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), spec)
+
+    def _index(self, loc_encoded, total_sqft, bhk, bath):
+        offset = total_sqft - self.sqft_min
+        if (offset % self.sqft_step or not self.sqft_min <= total_sqft <= self.sqft_max
+                or not 1 <= bhk <= self.bhk_max or not 1 <= bath <= self.bath_max
+                or not 0 <= loc_encoded < self.prices.shape[0]):
+            return None
+        return int(loc_encoded), int(offset // self.sqft_step), int(bhk) - 1, int(bath) - 1
+
+    def lookup(self, loc_encoded, total_sqft, bhk, bath):
+        """Predicted price, or None if the inputs fall outside the precomputed grid."""
+        index = self._index(loc_encoded, total_sqft, bhk, bath)
+        return None if index is None else float(self.prices[index])
+
+
+def build_surface(predictor, n_locations, model_name, version, surfaces_dir=SURFACES_DIR,
+                  sqft=(SQFT_MIN, SQFT_MAX, SQFT_STEP), bhk_max=BHK_MAX, bath_max=BATH_MAX):
+    """Evaluate the model over the full grid, one batched predict per location."""
+    sqft_values = np.arange(sqft[0], sqft[1] + 1, sqft[2], dtype=float)
+    bhks = np.arange(1, bhk_max + 1, dtype=float)
+    baths = np.arange(1, bath_max + 1, dtype=float)
+    s, b, ba = np.meshgrid(sqft_values, bhks, baths, indexing="ij")
+    grid = np.column_stack([s.ravel(), ba.ravel(), b.ravel()])  # total_sqft, bath, bhk
+
+    os.makedirs(surfaces_dir, exist_ok=True)
+    path = PriceSurface.path(model_name, version, surfaces_dir)
+    tmp = path[:-4] + ".tmp.npy"
+    shape = (n_locations, len(sqft_values), bhk_max, bath_max)
+    prices = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=shape)
+
+    start = time.perf_counter()
+    for loc in range(n_locations):
+        features = np.column_stack([np.full(len(grid), loc, dtype=float), grid])
+        prices[loc] = predictor.predict(features).reshape(shape[1:])
+    prices.flush()
+    del prices
+
+    spec = {"model": model_name, "version": version, "sqft": list(sqft),
+            "bhk_max": bhk_max, "bath_max": bath_max, "shape": list(shape)}
+    with open(path[:-4] + ".json", "w") as f:
+        json.dump(spec, f)
+    os.replace(tmp, path)
+
+    elapsed = time.perf_counter() - start
+    print(f"Built {model_name} surface {shape} ({np.prod(shape) * 4 / 1e6:.1f} MB) "
+          f"in {elapsed:.1f}s -> {path}")
+    return path
+
+
+# --- Lookup for the app ---
+
+_surfaces = {}
+_lock = threading.Lock()
+
+
+def get_surface(model_name):
+    """Surface for the currently loaded version of a model, or None if not built.
+
+    Keyed on the surface file's mtime as well as the model version, so a
+    surface built (or rebuilt) while the app runs is picked up on the next
+    lookup; a missing surface is re-checked every time (one stat).
+    """
+    try:
+        version = registry.version(model_name)
+        stamp = (version, os.stat(PriceSurface.path(model_name, version)).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    cached = _surfaces.get(model_name)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with _lock:
+        try:
+            surface = PriceSurface.load(model_name, version)
+        except FileNotFoundError:
+            return None
+        _surfaces[model_name] = (stamp, surface)
+        return surface
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute price surfaces for the app")
+    parser.add_argument('names', nargs='*', default=['model', 'decision_tree'],
+                        help="Registry artifact names to build surfaces for")
+    parser.add_argument('--sqft-step', type=int, default=SQFT_STEP)
+    parser.add_argument('--bhk-max', type=int, default=BHK_MAX)
+    parser.add_argument('--bath-max', type=int, default=BATH_MAX)
+    args = parser.parse_args()
+
+    n_locations = len(registry.get('label_encoder').classes_)
+    for name in args.names:
+        try:
+            # sklearn's Cython predict is the faster choice for these large batches
+            predictor = registry.get(name)
+        except FileNotFoundError:
+            print(f"Skipping {name}: {registry.path(name)} not found")
+            continue
+        build_surface(predictor, n_locations, name, registry.version(name),
+                      sqft=(SQFT_MIN, SQFT_MAX, args.sqft_step),
+                      bhk_max=args.bhk_max, bath_max=args.bath_max)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import argparse
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import agent
+import telemetry
+from location_index import get_location_index
+from model_registry import registry
+from telemetry import metrics
+from tree_engine import get_compiled
+
+HOST = "127.0.0.1"
+PORT = 8000
+LOG_PATH = os.path.join("logs", "requests.jsonl")
+MODELS = ("model", "decision_tree")
+
+# /value requests arriving within BATCH_WINDOW of the first one share a predict
+BATCH_WINDOW = 0.005
+MAX_BATCH = 256
+MAX_PENDING = 4096
+# Advisories queued or running; beyond this /advise answers 503
+MAX_PENDING_ADVICE = 32
+MODEL_WORKERS = 2
+ADVISE_WORKERS = 4
+VALUE_TIMEOUT = 5.0
+ADVISE_TIMEOUT = 120.0
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one batched predict.
+
+    A collector thread takes the first queued row, gathers whatever else
+    arrives within `window` seconds (up to `max_batch` rows) and hands the
+    batch to the bounded model pool; each caller waits on its own Future.
+    """
+
+    def __init__(self, pool, window=BATCH_WINDOW, max_batch=MAX_BATCH, max_pending=MAX_PENDING):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._collect, name="value-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, model_name, features):
+        if self._queue.qsize() >= self.max_pending:
+            raise Overloaded(f"{self._queue.qsize()} valuations pending")
+        future = Future()
+        self._queue.put((model_name, features, future))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.pool.submit(self._predict, batch)
+
+    @staticmethod
+    def _predict(batch):
+        metrics.observe("value_batch_size", len(batch), buckets=BATCH_BUCKETS)
+        for model_name in {name for name, _, _ in batch}:
+            rows = [(features, future) for name, features, future in batch if name == model_name]
+            try:
+                prices = get_compiled(model_name).predict(np.array([features for features, _ in rows]))
+            except Exception as e:
+                for _, future in rows:
+                    future.set_exception(e)
+                continue
+            for (_, future), price in zip(rows, prices):
+                future.set_result(float(price))
+
+
+class RequestLog:
+    """Appends one compact JSON line per request, replayable by loadgen.py."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", buffering=1)
+
+    def write(self, path, payload, status, seconds):
+        line = json.dumps({"t": round(time.time(), 3), "path": path, "req": payload,
+                           "status": status, "ms": round(seconds * 1000, 2)}, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class ValuationService:
+    def __init__(self, model_workers=MODEL_WORKERS, advise_workers=ADVISE_WORKERS,
+                 batch_window=BATCH_WINDOW, max_batch=MAX_BATCH, log_path=LOG_PATH,
+                 max_pending_advice=MAX_PENDING_ADVICE):
+        self.started = time.time()
+        self.model_pool = ThreadPoolExecutor(max_workers=model_workers, thread_name_prefix="model")
+        self.advise_pool = ThreadPoolExecutor(max_workers=advise_workers, thread_name_prefix="advise")
+        self.max_pending_advice = max_pending_advice
+        self._pending_advice = 0
+        self._advice_lock = threading.Lock()
+        self.batcher = MicroBatcher(self.model_pool, batch_window, max_batch)
+        self.log = RequestLog(log_path) if log_path else None
+
+    @staticmethod
+    def _details(payload):
+        if not isinstance(payload, dict):
+            raise BadRequest("expected a JSON object")
+        details = {"location": str(payload.get("location", "other"))}
+        for field, default in (("total_sqft", 1000), ("bath", 2), ("bhk", 2)):
+            try:
+                value = float(payload.get(field, default))
+            except (TypeError, ValueError):
+                raise BadRequest(f"{field} must be a number")
+            # json.loads and float() both accept NaN/Infinity
+            if not math.isfinite(value) or value <= 0:
+                raise BadRequest(f"{field} must be a positive number")
+            details[field] = value
+        for field in ("bath", "bhk"):
+            if not details[field].is_integer():
+                raise BadRequest(f"{field} must be a whole number")
+            details[field] = int(details[field])
+        return details
+
+    def value(self, payload):
+        details = self._details(payload)
+        model_name = payload.get("model", "model")
+        if model_name not in MODELS:
+            raise BadRequest(f"model must be one of {', '.join(MODELS)}")
+        code, method, matched = get_location_index().resolve(details["location"])
+        if method == "unknown":
+            raise BadRequest(f"unknown location '{details['location']}'")
+
+        features = [code, details["total_sqft"], details["bath"], details["bhk"]]
+        price = self.batcher.submit(model_name, features).result(timeout=VALUE_TIMEOUT)
+        return {
+            "predicted_price": price,
+            "location": matched,
+            "location_match": method,
+            "model": model_name,
+            "model_version": registry.version(model_name),
+        }
+
+    def advise(self, payload):
+        details = self._details(payload)
+        # The pool's own queue is unbounded, so admission is limited here
+        with self._advice_lock:
+            if self._pending_advice >= self.max_pending_advice:
+                raise Overloaded(f"{self._pending_advice} advisories pending")
+            self._pending_advice += 1
+        future = self.advise_pool.submit(agent.get_advisory, details)
+        future.add_done_callback(self._advice_done)
+        try:
+            state = future.result(timeout=ADVISE_TIMEOUT)
+        except FutureTimeout:
+            # Drop it if it never started; a running advisory is bounded by LLM_DEADLINE
+            future.cancel()
+            raise
+        return {
+            "trace_id": state["trace_id"],
+            "predicted_price": float(state["predicted_price"]),
+            "comparables": state["comparables"],
+            "advisory_report": state["advisory_report"],
+            "steps": state["steps"],
+        }
+
+    def _advice_done(self, future):
+        with self._advice_lock:
+            self._pending_advice -= 1
+
+    def health(self):
+        versions = {}
+        for name in MODELS + ("label_encoder",):
+            try:
+                versions[name] = registry.version(name)
+            except FileNotFoundError:
+                versions[name] = None
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "pending_valuations": self.batcher.pending(),
+            "pending_advisories": self._pending_advice,
+            "models": versions,
+        }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "GeoValService/1.0"
+    protocol_version = "HTTP/1.1"
+    routes = {
+        ("GET", "/health"): "health",
+        ("GET", "/metrics"): "metrics",
+        ("POST", "/value"): "value",
+        ("POST", "/advise"): "advise",
+    }
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        start = time.perf_counter()
+        service = self.server.service
+        path = self.path.split("?", 1)[0]
+        route = self.routes.get((method, path))
+        payload = None
+        try:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                # The body can't be drained, so the connection can't be reused
+                self.close_connection = True
+                raise BadRequest("invalid Content-Length")
+            # Always drain the body so a keep-alive connection stays in sync
+            raw = self.rfile.read(length)
+            if route is None:
+                status, body = 404, {"error": f"no route for {method} {path}"}
+            elif route == "metrics":
+                status, body = 200, metrics.prometheus()
+            elif route == "health":
+                status, body = 200, service.health()
+            else:
+                try:
+                    payload = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    raise BadRequest("invalid JSON body")
+                status, body = 200, getattr(service, route)(payload)
+        except BadRequest as e:
+            status, body = 400, {"error": str(e)}
+        except Overloaded as e:
+            status, body = 503, {"error": f"overloaded: {e}"}
+        except FutureTimeout:
+            status, body = 504, {"error": "timed out"}
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+
+        self._send(status, body)
+        seconds = time.perf_counter() - start
+        metrics.inc("http_requests_total", path=path if route else "other", status=status)
+        metrics.observe("http_request_seconds", seconds, path=path if route else "other")
+        if service.log is not None and route in ("value", "advise"):
+            service.log.write(path, payload, status, seconds)
+
+    def _send(self, status, body):
+        if isinstance(body, str):
+            data, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            data, content_type = json.dumps(body).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # every request is already in the JSONL log and /metrics
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The stdlib default backlog of 5 drops connections under concurrent load
+    request_queue_size = 256
+
+
+def make_server(host=HOST, port=PORT, **service_options):
+    server = ServiceServer((host, port), ServiceHandler)
+    server.service = ValuationService(**service_options)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP valuation and advisory service")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--model-workers', type=int, default=MODEL_WORKERS,
+                        help="Threads running batched predicts")
+    parser.add_argument('--advise-workers', type=int, default=ADVISE_WORKERS,
+                        help="Advisories run at once; further /advise requests queue")
+    parser.add_argument('--max-pending-advice', type=int, default=MAX_PENDING_ADVICE,
+                        help="Advisories queued or running before /advise answers 503")
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW * 1000)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--log', default=LOG_PATH, help="Request log (empty to disable)")
+    parser.add_argument('--no-warm-up', action='store_true', help="Skip loading models/embeddings before serving")
+    args = parser.parse_args()
+
+    # /metrics is part of the service, so metrics are on unless AGENT_METRICS=0
+    telemetry.configure(enabled=os.getenv("AGENT_METRICS", "1").lower() in ("1", "true", "yes"))
+    if not args.no_warm_up:
+        agent.warm_up()
+
+    server = make_server(args.host, args.port, model_workers=args.model_workers,
+                         advise_workers=args.advise_workers, batch_window=args.batch_window_ms / 1000,
+                         max_batch=args.max_batch, log_path=args.log,
+                         max_pending_advice=args.max_pending_advice)
+    print(f"Serving on http://{args.host}:{args.port} (POST /value, POST /advise, GET /metrics, GET /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# What app.py imports before its first paint, and what the AI Advisor adds
+APP_MODULES = ["streamlit", "plotly.express", "model_registry", "location_index",
+               "tree_engine", "price_surface", "comps"]
+AGENT_MODULES = ["agent"]
+SAMPLE = {"location": "Whitefield", "total_sqft": 1200, "bath": 2, "bhk": 3}
+
+
+def timed(name, fn, timings):
+    start = time.perf_counter()
+    result = fn()
+    timings[name] = time.perf_counter() - start
+    print(f"[{timings[name]:8.3f}s] {name}")
+    return result
+
+
+def profile(llm="stub", fake_embeddings=False):
+    """Replay a cold start in this (fresh) process: the valuation path first,
+    then the agent stack, its warm-up and the first two advisories."""
+    import importlib
+
+    if llm == "stub":
+        os.environ["ADVISOR_LLM"] = "stub"
+    os.environ.setdefault("ADVISORY_CACHE_PATH", "")
+
+    timings = {}
+    for module in APP_MODULES:
+        timed(f"import {module}", lambda: importlib.import_module(module), timings)
+
+    def first_valuation():
+        import numpy as np
+        from location_index import get_location_index
+        from tree_engine import get_compiled
+        code = get_location_index().encode(SAMPLE["location"])
+        features = np.array([[code, SAMPLE["total_sqft"], SAMPLE["bath"], SAMPLE["bhk"]]])
+        return get_compiled('model').predict(features)
+    timed("first valuation", first_valuation, timings)
+
+    agent = timed("import agent", lambda: importlib.import_module("agent"), timings)
+    if fake_embeddings:
+        import vector_store
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        vector_store._embeddings = vector_store.CachedEmbeddings(DeterministicFakeEmbedding(size=384))
+    warm = timed("agent.warm_up", agent.warm_up, timings)
+    timings.update({f"warm_up: {name}": seconds for name, seconds in warm.items()})
+    timed("first advisory", lambda: agent.get_advisory(SAMPLE), timings)
+    timed("second advisory", lambda: agent.get_advisory(SAMPLE), timings)
+    return timings
+
+
+def import_times(statement, top=15):
+    """Slowest imports (cumulative seconds) for `import <statement>` in a fresh interpreter."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {statement}"],
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(2)) / 1e6, len(match.group(3)), match.group(4)))
+    # The requested modules and what they import directly; deeper levels are
+    # already included in those cumulative times
+    rows = [r for r in rows if r[1] <= 3]
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile cold-start import and first-request times")
+    parser.add_argument('--llm', choices=['stub', 'groq'], default='stub',
+                        help="Use the offline stub (default) or the real Groq client for the advisories")
+    parser.add_argument('--fake-embeddings', action='store_true',
+                        help="Skip loading all-MiniLM-L6-v2 (measures everything else)")
+    parser.add_argument('--importtime', action='store_true',
+                        help="Also list the slowest imports on the app and agent sides (python -X importtime)")
+    parser.add_argument('--output', help="Write the timings as JSON")
+    args = parser.parse_args()
+
+    # The profile must run in a fresh interpreter to see real cold-start costs
+    start = time.perf_counter()
+    timings = profile(args.llm, args.fake_embeddings)
+    total = time.perf_counter() - start
+    app_ready = sum(v for k, v in timings.items() if k.startswith("import ") and k != "import agent")
+    app_ready += timings["first valuation"]
+    print(f"\nValuation UI ready after {app_ready:.2f}s; "
+          f"agent import + warm-up add {timings['import agent'] + timings['agent.warm_up']:.2f}s "
+          f"(total {total:.2f}s)")
+
+    if args.importtime:
+        for label, modules in (("app", APP_MODULES), ("agent", AGENT_MODULES)):
+            print(f"\nSlowest imports ({label}):")
+            for seconds, _, name in import_times("; import ".join(modules)):
+                print(f"  {seconds:8.3f}s  {name}")
+
+    if args.output:
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"timings": timings, "total": total}, f, indent=2)
+        print(f"\nTimings written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+# Off unless AGENT_METRICS=1; when off, span() hands back a shared no-op
+# context manager and the counters return immediately.
+ENABLED = False
+METRICS_PATH = "metrics/agent_metrics.json"
+EXPORT_INTERVAL = 5.0
+RECENT_SPANS = 2000
+
+# Histogram bucket upper bounds, in seconds for latencies
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def configure(enabled=None, path=None):
+    """Read AGENT_METRICS / AGENT_METRICS_PATH (call after load_dotenv), or set them explicitly."""
+    global ENABLED, METRICS_PATH
+    if enabled is None:
+        enabled = os.getenv("AGENT_METRICS", "0").lower() in ("1", "true", "yes")
+    ENABLED = enabled
+    METRICS_PATH = os.getenv("AGENT_METRICS_PATH", METRICS_PATH) if path is None else path
+
+
+configure()
+
+
+class Metrics:
+    """In-process counters and fixed-bucket histograms, exportable as JSON or Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.spans = deque(maxlen=RECENT_SPANS)
+        self._last_export = 0.0
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not ENABLED:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1),
+                                               "sum": 0.0, "count": 0}
+            i = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            hist["counts"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def record_span(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def trace(self, trace_id):
+        """Finished spans for one trace, in completion order."""
+        with self._lock:
+            return [s for s in self.spans if s["trace_id"] == trace_id]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "histograms": [
+                    {"name": n, "labels": dict(l), "buckets": list(h["buckets"]), "counts": list(h["counts"]),
+                     "sum": h["sum"], "count": h["count"]}
+                    for (n, l), h in self.histograms.items()
+                ],
+                "recent_spans": list(self.spans),
+            }
+
+    def prometheus(self):
+        return prometheus_text(self.snapshot())
+
+    def export(self, path=None):
+        path = path or METRICS_PATH
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+        self._last_export = time.time()
+
+    def maybe_export(self):
+        """Export to METRICS_PATH at most once every EXPORT_INTERVAL seconds."""
+        if ENABLED and METRICS_PATH and time.time() - self._last_export >= EXPORT_INTERVAL:
+            self.export()
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+
+metrics = Metrics()
+
+
+def prometheus_text(snapshot):
+    """Prometheus text exposition format for a Metrics snapshot."""
+    def fmt(labels, extra=()):
+        items = sorted(labels.items()) + list(extra)
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+    lines = []
+    for c in sorted(snapshot["counters"], key=lambda c: (c["name"], sorted(c["labels"].items()))):
+        lines.append(f"{c['name']}{fmt(c['labels'])} {c['value']}")
+    for h in sorted(snapshot["histograms"], key=lambda h: (h["name"], sorted(h["labels"].items()))):
+        cumulative = 0
+        for bound, count in zip(h["buckets"], h["counts"]):
+            cumulative += count
+            lines.append(f"{h['name']}_bucket{fmt(h['labels'], [('le', bound)])} {cumulative}")
+        lines.append(f"{h['name']}_bucket{fmt(h['labels'], [('le', '+Inf')])} {h['count']}")
+        lines.append(f"{h['name']}_sum{fmt(h['labels'])} {h['sum']}")
+        lines.append(f"{h['name']}_count{fmt(h['labels'])} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, name, trace_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = attributes
+
+    def __enter__(self):
+        if self.trace_id is None:
+            self.trace_id = _current_trace.get()
+        self._token = _current_trace.set(self.trace_id)
+        self.start = time.perf_counter()
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _current_trace.reset(self._token)
+        metrics.observe("agent_span_seconds", seconds, span=self.name)
+        if exc_type is not None:
+            metrics.inc("agent_span_errors_total", span=self.name)
+        metrics.record_span({
+            "trace_id": self.trace_id,
+            "span": self.name,
+            "start": self.start_time,
+            "seconds": seconds,
+            "error": exc_type.__name__ if exc_type else None,
+            **self.attributes,
+        })
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def span(name, trace_id=None, **attributes):
+    """Time a block as a span of `trace_id` (or of the enclosing span's trace)."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, trace_id, attributes)
+
+
+def traced(name):
+    """Decorator for graph nodes: one span per call, tagged with the state's trace_id."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state, *args, **kwargs):
+                with span(name, trace_id=state.get("trace_id")):
+                    return await fn(state, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            with span(name, trace_id=state.get("trace_id")):
+                return fn(state, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English prose; only used when the provider
+    # does not report usage (e.g. the stub LLM)
+    return max(1, round(len(text) / 4)) if text else 0
+
+
+def record_llm_usage(prompt, completion, usage=None):
+    """Count prompt/response tokens from the provider's usage_metadata, else estimate them."""
+    if not ENABLED:
+        return
+    if usage and usage.get("output_tokens"):
+        source, prompt_tokens, completion_tokens = "provider", usage["input_tokens"], usage["output_tokens"]
+    else:
+        source, prompt_tokens, completion_tokens = "estimated", estimate_tokens(prompt), estimate_tokens(completion)
+    metrics.inc("llm_prompt_tokens_total", prompt_tokens, source=source)
+    metrics.inc("llm_completion_tokens_total", completion_tokens, source=source)
+    metrics.observe("llm_completion_tokens", completion_tokens, buckets=TOKEN_BUCKETS)
+
+
+# --- Reading an exported file ---
+
+def summarize(snapshot):
+    """Count/mean/max per span from the recent spans in a snapshot."""
+    rows = {}
+    for s in snapshot["recent_spans"]:
+        row = rows.setdefault(s["span"], {"count": 0, "total": 0.0, "max": 0.0, "errors": 0})
+        row["count"] += 1
+        row["total"] += s["seconds"]
+        row["max"] = max(row["max"], s["seconds"])
+        row["errors"] += s["error"] is not None
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect exported agent metrics")
+    parser.add_argument('--path', default=None, help=f"Exported metrics file (default {METRICS_PATH})")
+    parser.add_argument('--trace', help="Print the spans of one trace ID")
+    parser.add_argument('--prometheus', action='store_true', help="Print in Prometheus text format")
+    args = parser.parse_args()
+
+    args.path = args.path or METRICS_PATH
+    with open(args.path) as f:
+        snapshot = json.load(f)
+
+    if args.prometheus:
+        print(prometheus_text(snapshot), end="")
+    elif args.trace:
+        spans = sorted((s for s in snapshot["recent_spans"] if s["trace_id"] == args.trace),
+                       key=lambda s: s["start"])
+        if not spans:
+            print(f"No spans for trace {args.trace} in {args.path}")
+        t0 = spans[0]["start"] if spans else 0
+        for s in spans:
+            error = f"  ERROR {s['error']}" if s["error"] else ""
+            print(f"+{(s['start'] - t0) * 1000:9.1f}ms {s['span']:20s} {s['seconds'] * 1000:9.1f}ms{error}")
+    else:
+        print(f"{'span':20s} {'count':>7s} {'mean ms':>9s} {'max ms':>9s} {'errors':>7s}")
+        for name, row in sorted(summarize(snapshot).items(), key=lambda kv: -kv[1]["total"]):
+            print(f"{name:20s} {row['count']:7d} {row['total'] / row['count'] * 1000:9.1f} "
+                  f"{row['max'] * 1000:9.1f} {row['errors']:7d}")
+
+
+if __name__ == "__main__":
+    main()
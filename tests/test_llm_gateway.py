@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import llm
+from llm import StubLLM
+from llm_gateway import DeadlineExceeded, LLMGateway, LLMUnavailable
+
+
+@pytest.fixture
+def stub():
+    previous = llm._llm
+    yield lambda **options: (llm.set_llm(StubLLM(**options)), llm.get_llm())[1]
+    llm.set_llm(previous)
+
+
+def test_identical_prompts_share_one_call(stub):
+    model = stub(latency=0.2)
+    gateway = LLMGateway(max_concurrency=2)
+    with ThreadPoolExecutor(8) as pool:
+        reports = list(pool.map(lambda _: gateway.invoke("- same").content, range(8)))
+    assert model.calls == 1
+    assert len(set(reports)) == 1
+    assert gateway.stats["deduplicated"] == 7
+
+
+def test_concurrency_is_capped(stub):
+    model = stub(latency=0.05)
+    gateway = LLMGateway(max_concurrency=3)
+    with ThreadPoolExecutor(12) as pool:
+        list(pool.map(lambda i: gateway.invoke(f"- p{i}"), range(12)))
+    assert model.calls == 12
+    assert model.max_active <= 3
+
+
+def test_rate_limits_are_retried(stub):
+    model = stub(latency=0.01, concurrency_limit=2)
+    gateway = LLMGateway(max_concurrency=8, backoff=0.01, max_retries=20)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: gateway.invoke(f"- p{i}"), range(16)))
+    assert model.calls == 16
+    assert model.rate_limited == gateway.stats["retries"] > 0
+
+
+def test_retries_are_bounded(stub):
+    stub(rate_limit_rate=1.0)
+    with pytest.raises(LLMUnavailable):
+        LLMGateway(max_retries=2, backoff=0.01).invoke("- p")
+
+
+def test_stalled_call_is_bounded_by_deadline(stub):
+    stub(latency=30)
+    gateway = LLMGateway(deadline=0.3, backoff=0.01)
+    with pytest.raises(DeadlineExceeded):
+        gateway.invoke("- p")
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(gateway.ainvoke("- p"))
+    assert gateway._slots.acquire(blocking=False)
+
+
+def test_cancelled_follower_does_not_fail_the_others(stub):
+    model = stub(latency=0.5)
+    gateway = LLMGateway()
+
+    async def run():
+        leader = asyncio.ensure_future(gateway.ainvoke("- same"))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.ensure_future(gateway.ainvoke("- same")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        followers[0].cancel()
+        return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+    leader, cancelled, other = asyncio.run(run())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert leader.content == other.content
+    assert model.calls == 1
+
+
+def test_identical_streams_share_one_call(stub):
+    model = stub(latency=0.3)
+    gateway = LLMGateway()
+
+    def consume(_):
+        return "".join(chunk.content for chunk in gateway.stream("- same"))
+
+    with ThreadPoolExecutor(6) as pool:
+        reports = list(pool.map(consume, range(6)))
+    assert model.calls == 1
+    assert len(set(reports)) == 1 and reports[0]
+    # A stream that starts after the first finished makes a new call
+    assert consume(None) == reports[0]
+    assert model.calls == 2
+
+
+def test_stream_retries_before_first_chunk(stub):
+    model = stub(rate_limit_rate=0.5, seed=3)
+    gateway = LLMGateway(backoff=0.01, max_retries=10)
+    assert "".join(chunk.content for chunk in gateway.stream("- p"))
+    assert model.rate_limited == gateway.stats["retries"] > 0
@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeRegressor
+
+from comps import build_comps
+from model_registry import ARTIFACTS, METADATA_FILE, MODELS_DIR
+from tree_engine import COMPACT, COMPACT_SUFFIX, compare_compact, export_compact, print_compact_report
+
+DATA_PATH = "data/housing.csv"
+
+
+@contextmanager
+def stage(name, timings):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+    print(f"[{timings[name]:8.3f}s] {name}")
+
+
+# --- Preprocessing (vectorized port of notebook/EDA_and_training.ipynb) ---
+
+def convert_sqft_to_num(sqft):
+    """Vectorized notebook convert_sqft_to_num: numbers pass through, "a - b"
+    ranges become their midpoint, anything else becomes NaN."""
+    sqft = sqft.astype(str)
+    numeric = pd.to_numeric(sqft, errors='coerce')
+
+    tokens = sqft.str.split('-')
+    is_range = numeric.isna() & (tokens.str.len() == 2)
+    low = pd.to_numeric(tokens.str[0].where(is_range), errors='coerce')
+    high = pd.to_numeric(tokens.str[1].where(is_range), errors='coerce')
+    return numeric.where(~is_range, (low + high) / 2)
+
+
+def clean(df):
+    df = df.drop(['area_type', 'availability', 'society', 'balcony'], axis=1)
+    df = df.dropna()
+
+    df['bhk'] = df['size'].str.split(' ').str[0].astype(int)
+    df = df.drop('size', axis=1)
+
+    df['total_sqft'] = convert_sqft_to_num(df['total_sqft'])
+    df = df.dropna()
+
+    df = df[~(df.total_sqft / df.bhk < 300)]
+    df = df.assign(price_per_sqft=df['price'] * 100000 / df['total_sqft'])
+    return df
+
+
+def remove_pps_outliers(df):
+    """Keep rows within one (population) std of their location's mean price/sqft.
+
+    One groupby-transform pass instead of concatenating per-location frames;
+    rows come out grouped by location in sorted order, as the notebook's loop
+    produced them.
+    """
+    grouped = df.groupby('location')['price_per_sqft']
+    mean = grouped.transform('mean')
+    std = grouped.transform('std', ddof=0)
+    keep = (df.price_per_sqft > (mean - std)) & (df.price_per_sqft <= (mean + std))
+    return df[keep].sort_values('location', kind='stable').reset_index(drop=True)
+
+
+# --- Training ---
+
+def train(df, n_estimators=100, n_jobs=-1, random_state=42, timings=None):
+    timings = {} if timings is None else timings
+
+    with stage("encode", timings):
+        label_encoder = LabelEncoder()
+        df = df.assign(location=label_encoder.fit_transform(df['location']))
+        X = df.drop(['price', 'price_per_sqft'], axis=1)
+        y = df['price']
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=random_state)
+
+    with stage("train random forest", timings):
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)
+        model.fit(X_train, y_train)
+
+    with stage("train decision tree", timings):
+        dt_model = DecisionTreeRegressor(random_state=random_state)
+        dt_model.fit(X_train, y_train)
+
+    with stage("evaluate", timings):
+        metrics = {}
+        for name, estimator in (("random_forest", model), ("decision_tree", dt_model)):
+            y_pred = estimator.predict(X_test)
+            metrics[name] = {
+                "r2": float(r2_score(y_test, y_pred)),
+                "mae_lakhs": float(mean_absolute_error(y_test, y_pred)),
+            }
+            print(f"  {name}: R2 {metrics[name]['r2'] * 100:.2f}%, "
+                  f"MAE {metrics[name]['mae_lakhs']:.2f} Lakhs")
+
+    return {
+        "model": model,
+        "decision_tree": dt_model,
+        "label_encoder": label_encoder,
+        "columns": X.columns.tolist(),
+        "metrics": metrics,
+        "split": (X_train, X_test, y_train, y_test),
+        "frame": df,
+    }
+
+
+# --- Artifacts ---
+
+def _atomic_write(path, data):
+    # Write-then-rename so the model registry never sees a half-written file
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def save_artifacts(result, models_dir, metadata):
+    # The encoder and columns go first and metadata.json (with every
+    # artifact's hash) last: the registry only swaps in files that
+    # metadata.json lists, so readers move to the new set all at once
+    os.makedirs(models_dir, exist_ok=True)
+    metadata["artifacts"] = {}
+    for name in ("label_encoder", "columns", "model", "decision_tree"):
+        data = pickle.dumps(result[name])
+        _atomic_write(os.path.join(models_dir, ARTIFACTS[name]), data)
+        metadata["artifacts"][name] = hashlib.sha256(data).hexdigest()
+    _atomic_write(os.path.join(models_dir, METADATA_FILE),
+                  json.dumps(metadata, indent=2).encode('utf-8'))
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_compact_models(result, models_dir, limits=COMPACT):
+    """Write <artifact>.compact.npz for each model and report it against the full model on the test split."""
+    _, X_test, _, y_test = result["split"]
+    reports = {}
+    for name, model_limits in limits.items():
+        full_path = os.path.join(models_dir, ARTIFACTS[name])
+        path = os.path.splitext(full_path)[0] + COMPACT_SUFFIX
+        export_compact(result[name], path, **model_limits)
+        reports[name] = {"limits": model_limits, **compare_compact(result[name], full_path, path, X_test, y_test)}
+        print_compact_report(f"  {name} {model_limits}", reports[name])
+    return reports
+
+
+def run(data_path=DATA_PATH, models_dir=MODELS_DIR, n_estimators=100, n_jobs=-1, random_state=42,
+        compact=COMPACT):
+    timings = {}
+    total_start = time.perf_counter()
+
+    with stage("load", timings):
+        raw = pd.read_csv(data_path)
+    print(f"  {len(raw)} rows from {data_path}")
+
+    with stage("clean", timings):
+        df = clean(raw)
+    print(f"  {len(df)} rows after cleaning")
+
+    with stage("remove outliers", timings):
+        df = remove_pps_outliers(df)
+    print(f"  {len(df)} rows after removing price/sqft outliers")
+
+    result = train(df, n_estimators=n_estimators, n_jobs=n_jobs,
+                   random_state=random_state, timings=timings)
+
+    data_hash = _file_sha256(data_path)
+    trained_at = datetime.now(timezone.utc)
+    metadata = {
+        "version": f"{trained_at:%Y%m%d%H%M%S}-{data_hash[:8]}",
+        "trained_at": trained_at.isoformat(),
+        "data_path": data_path,
+        "data_sha256": data_hash,
+        "rows": {"raw": len(raw), "train": len(result["split"][0]), "test": len(result["split"][1])},
+        "columns": result["columns"],
+        "params": {"n_estimators": n_estimators, "random_state": random_state},
+        "metrics": result["metrics"],
+        "versions": {"sklearn": sklearn.__version__, "pandas": pd.__version__, "numpy": np.__version__},
+        "timings": timings,
+    }
+
+    with stage("save artifacts", timings):
+        save_artifacts(result, models_dir, metadata)
+
+    with stage("build comps index", timings):
+        # Keyed to the encoder just written, the same hash the registry reports
+        encoder_version = metadata["artifacts"]["label_encoder"][:12]
+        build_comps(result["frame"], len(result["label_encoder"].classes_), encoder_version,
+                    os.path.join(models_dir, "comps"))
+
+    if compact:
+        with stage("export compact models", timings):
+            metadata["compact"] = export_compact_models(result, models_dir, compact)
+        _atomic_write(os.path.join(models_dir, METADATA_FILE),
+                      json.dumps(metadata, indent=2).encode('utf-8'))
+
+    print(f"Trained model version {metadata['version']} in "
+          f"{time.perf_counter() - total_start:.2f}s -> {models_dir}/")
+    return result, metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the valuation models from the housing dataset")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Cores for the Random Forest (-1 = all)")
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--no-compact', action='store_true', help="Skip the pruned float32 exports")
+    parser.add_argument('--compact-max-depth', type=int, help="Prune compact trees to this depth")
+    parser.add_argument('--compact-max-leaves', type=int,
+                        help=f"Leaves per compact tree (default {COMPACT['model']['max_leaves']})")
+    parser.add_argument('--compact-n-estimators', type=int,
+                        help=f"Trees in the compact forest (default {COMPACT['model']['n_estimators']})")
+    args = parser.parse_args()
+
+    compact = {}
+    if not args.no_compact:
+        for name, defaults in COMPACT.items():
+            compact[name] = dict(defaults)
+            for key in ("max_depth", "max_leaves", "n_estimators"):
+                value = getattr(args, f"compact_{key}")
+                if value is not None and (key != "n_estimators" or name == "model"):
+                    compact[name][key] = value
+    run(args.data, args.models_dir, args.n_estimators, args.n_jobs, args.random_state, compact)
+
+
+if __name__ == "__main__":
+    main()
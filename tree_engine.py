@@ -0,0 +1,464 @@
+import argparse
+import heapq
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_registry import registry
+
+# Arrays stored per exported model, all contiguous and concatenated across trees
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'missing_left', 'roots')
+# Below this many (row, tree) pairs a plain Python walk beats per-level NumPy overhead
+SCALAR_WALK_LIMIT = 16
+# Default size limits for the compact exports the app can load instead of the full models
+COMPACT = {
+    "model": {"n_estimators": 30, "max_leaves": 1024},
+    "decision_tree": {"max_leaves": 1024},
+}
+COMPACT_SUFFIX = ".compact.npz"
+
+
+def _prune(tree, max_depth=None, max_leaves=None):
+    """Nodes of a fitted sklearn tree to keep under depth/leaf limits.
+
+    Grows the kept tree best-first, always expanding the leaf whose split
+    removed the most weighted impurity (as sklearn does for max_leaf_nodes),
+    so the splits that matter most survive. Returns the kept node ids in
+    ascending order and the impurity decrease credited to each feature.
+    """
+    left, right = tree.children_left, tree.children_right
+    weight, impurity = tree.weighted_n_node_samples, tree.impurity
+
+    def gain(node):
+        l, r = left[node], right[node]
+        return weight[node] * impurity[node] - weight[l] * impurity[l] - weight[r] * impurity[r]
+
+    kept = [0]
+    importances = np.zeros(tree.n_features)
+    frontier = [(-gain(0), 0, 0)] if left[0] != -1 and max_depth != 0 else []
+    leaves = 1
+    while frontier and (max_leaves is None or leaves < max_leaves):
+        neg_gain, node, depth = heapq.heappop(frontier)
+        importances[tree.feature[node]] -= neg_gain
+        kept += [left[node], right[node]]
+        leaves += 1
+        for child in (left[node], right[node]):
+            if left[child] != -1 and (max_depth is None or depth + 1 < max_depth):
+                heapq.heappush(frontier, (-gain(child), child, depth + 1))
+    return np.sort(np.array(kept)), importances
+
+
+def _float32_floor(threshold):
+    # Largest float32 <= threshold: for float32 inputs, x <= t32 exactly when x <= t
+    t32 = threshold.astype(np.float32)
+    return np.where(t32.astype(np.float64) > threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+
+
+class CompiledTrees:
+    """Flat-array evaluator for sklearn DecisionTreeRegressor / RandomForestRegressor.
+
+    All trees are concatenated into one set of node arrays and a batch of rows
+    is walked through every tree at once, one tree level per NumPy step.
+    Leaves point at themselves, so rows that reach a leaf early just stay put.
+    Predictions are bit-identical to `estimator.predict`: inputs are cast to
+    float32 like sklearn does, and forest outputs are summed tree by tree in
+    estimator order before dividing by the number of trees.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, roots,
+                 max_depth, n_features_in_, feature_importances_=None, average=True):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = missing_left
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features_in_)
+        self.feature_importances_ = feature_importances_
+        self.average = bool(average)
+        self._lists = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    @classmethod
+    def from_estimator(cls, estimator, max_depth=None, max_leaves=None, n_estimators=None, compact=False):
+        """Flatten a fitted estimator; with no limits the result predicts bit-identically.
+
+        max_depth / max_leaves prune every tree (internal nodes become leaves
+        holding their training mean), n_estimators keeps only the first trees
+        of a forest, and compact stores thresholds and values as float32
+        (thresholds rounded down, so splits are unchanged) with int8 features.
+        """
+        from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+        from sklearn.tree import DecisionTreeRegressor
+
+        if isinstance(estimator, DecisionTreeRegressor):
+            trees, average = [estimator.tree_], False
+        elif isinstance(estimator, (RandomForestRegressor, ExtraTreesRegressor)):
+            trees, average = [e.tree_ for e in estimator.estimators_], True
+        else:
+            raise TypeError(f"Cannot compile {type(estimator).__name__}; "
+                            "expected a DecisionTreeRegressor or RandomForestRegressor")
+        if trees[0].n_outputs != 1:
+            raise TypeError("Only single-output regressors are supported")
+        pruned = max_depth is not None or max_leaves is not None
+        trees = trees[:n_estimators]
+
+        features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+        importances = []
+        offset = 0
+        for tree in trees:
+            if pruned:
+                keep, tree_importances = _prune(tree, max_depth, max_leaves)
+                importances.append(tree_importances / max(tree_importances.sum(), 1e-12))
+            else:
+                keep = np.arange(tree.node_count)
+            n = len(keep)
+            ids = np.arange(n)
+            remap = np.full(tree.node_count, -1)
+            remap[keep] = ids
+            children_left, children_right = tree.children_left[keep], tree.children_right[keep]
+            # Pruned nodes keep both children or neither
+            is_leaf = (children_left == -1) | (remap[children_left] == -1)
+
+            features.append(np.where(is_leaf, 0, tree.feature[keep]))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold[keep]))
+            lefts.append(np.where(is_leaf, ids, remap[children_left]) + offset)
+            rights.append(np.where(is_leaf, ids, remap[children_right]) + offset)
+            values.append(tree.value[keep, 0, 0])
+            if hasattr(tree, 'missing_go_to_left'):
+                missing.append(tree.missing_go_to_left[keep].astype(bool))
+            else:
+                missing.append(np.zeros(n, dtype=bool))
+            roots.append(offset)
+            offset += n
+
+        index_dtype = np.int32 if offset < 2**31 else np.int64
+        threshold = np.concatenate(thresholds)
+        if compact:
+            threshold = _float32_floor(threshold)
+        if pruned:
+            feature_importances = np.mean(importances, axis=0)
+        elif average and n_estimators is not None:
+            feature_importances = np.mean([e.feature_importances_ for e in estimator.estimators_[:n_estimators]],
+                                          axis=0)
+        else:
+            feature_importances = estimator.feature_importances_
+        feature_dtype = np.int8 if compact and estimator.n_features_in_ < 128 else np.int32
+        tree_depth = max(tree.max_depth for tree in trees)
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=feature_dtype),
+            threshold=np.ascontiguousarray(threshold, dtype=np.float32 if compact else np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=index_dtype),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=index_dtype),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float32 if compact else np.float64),
+            missing_left=np.concatenate(missing),
+            roots=np.array(roots, dtype=index_dtype),
+            max_depth=tree_depth if max_depth is None else min(tree_depth, max_depth),
+            n_features_in_=estimator.n_features_in_,
+            feature_importances_=feature_importances,
+            average=average,
+        )
+
+    def apply(self, X):
+        """Leaf node index of every row in every tree, shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+
+        if X.shape[0] * self.n_trees <= SCALAR_WALK_LIMIT:
+            return self._apply_scalar(X)
+
+        rows = np.arange(X.shape[0])[:, None]
+        idx = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        has_nan = np.isnan(X).any()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[idx]]
+            go_left = x <= self.threshold[idx]
+            if has_nan:
+                go_left = np.where(np.isnan(x), self.missing_left[idx], go_left)
+            next_idx = np.where(go_left, self.left[idx], self.right[idx])
+            if np.array_equal(next_idx, idx):
+                break  # every row has reached a leaf in every tree
+            idx = next_idx
+        return idx
+
+    def _apply_scalar(self, X):
+        if self._lists is None:
+            self._lists = tuple(getattr(self, name).tolist()
+                                for name in ('feature', 'threshold', 'left', 'right', 'missing_left'))
+        feature, threshold, left, right, missing_left = self._lists
+
+        out = np.empty((X.shape[0], self.n_trees), dtype=self.roots.dtype)
+        for i, row in enumerate(X.tolist()):
+            for t, node in enumerate(self.roots.tolist()):
+                while True:
+                    x = row[feature[node]]
+                    if x != x:  # NaN
+                        nxt = left[node] if missing_left[node] else right[node]
+                    else:
+                        nxt = left[node] if x <= threshold[node] else right[node]
+                    if nxt == node:
+                        break
+                    node = nxt
+                out[i, t] = node
+        return out
+
+    def predict(self, X):
+        leaf_values = self.value[self.apply(X)]
+        if not self.average:
+            return leaf_values[:, 0].astype(np.float64, copy=False)
+        # Sequential running sum, matching sklearn's per-tree accumulation order
+        # (in float64 even when compact exports store float32 leaf values)
+        return np.cumsum(leaf_values, axis=1, dtype=np.float64)[:, -1] / self.n_trees
+
+    def save(self, path, compressed=False):
+        (np.savez_compressed if compressed else np.savez)(
+            path,
+            **{name: getattr(self, name) for name in ARRAYS},
+            meta=np.array([self.max_depth, self.n_features_in_, int(self.average)]),
+            feature_importances=(self.feature_importances_
+                                 if self.feature_importances_ is not None else np.array([])),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            max_depth, n_features, average = (int(v) for v in data['meta'])
+            importances = data['feature_importances']
+            return cls(
+                **{name: data[name] for name in ARRAYS},
+                max_depth=max_depth,
+                n_features_in_=n_features,
+                feature_importances_=importances if importances.size else None,
+                average=bool(average),
+            )
+
+
+# --- Drop-in predictors backed by the model registry ---
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+def get_compiled(name):
+    """Compiled version of a registry artifact, rebuilt whenever the pickle changes.
+
+    Falls back to the sklearn estimator itself if it cannot be compiled.
+    """
+    entry = registry.entry(name)
+    cached = _compiled.get(name)
+    if cached is not None and cached[0] == entry.sha256:
+        return cached[1]
+
+    with _lock:
+        cached = _compiled.get(name)
+        if cached is not None and cached[0] == entry.sha256:
+            return cached[1]
+        try:
+            predictor = CompiledTrees.from_estimator(entry.obj)
+        except TypeError as e:
+            print(f"Using sklearn predict for {name}: {e}")
+            predictor = entry.obj
+        _compiled[name] = (entry.sha256, predictor)
+        return predictor
+
+
+def compact_path(name):
+    return os.path.splitext(registry.path(name))[0] + COMPACT_SUFFIX
+
+
+def compact_version(name):
+    """Changes whenever the compact export is rewritten; raises FileNotFoundError if there is none."""
+    st = os.stat(compact_path(name))
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def get_compact(name):
+    """The compact export of a registry model, reloaded when its file changes."""
+    version = compact_version(name)
+    key = name + COMPACT_SUFFIX
+    cached = _compiled.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _compiled.get(key)
+        if cached is None or cached[0] != version:
+            _compiled[key] = (version, CompiledTrees.load(compact_path(name)))
+        return _compiled[key][1]
+
+
+# --- Compact export ---
+
+def export_compact(estimator, path, **limits):
+    """Prune/truncate a model with `limits` and save it as a compressed float32 .npz."""
+    compiled = CompiledTrees.from_estimator(estimator, compact=True, **limits)
+    compiled.save(path, compressed=True)
+    if not path.endswith('.npz'):
+        path += '.npz'
+    return compiled, path
+
+
+def compare_compact(estimator, full_path, compact_path, X_test, y_test, repeats=200):
+    """Size, load time, latency and held-out accuracy of a compact export vs the full model."""
+    import pickle
+    import warnings
+
+    from sklearn.metrics import mean_absolute_error, r2_score
+
+    def timed_load(load):
+        start = time.perf_counter()
+        obj = load()
+        return obj, time.perf_counter() - start
+
+    def load_pickle():
+        with open(full_path, 'rb') as f:
+            return pickle.load(f)
+
+    full, full_load = timed_load(load_pickle)
+    compact, compact_load = timed_load(lambda: CompiledTrees.load(compact_path))
+    X = np.asarray(X_test, dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        full_pred = full.predict(X)
+        full_latency = _time_single_row(get_predictor(full).predict, X, repeats)
+    compact_pred = compact.predict(X)
+    compact_latency = _time_single_row(compact.predict, X, repeats)
+
+    report = {}
+    for label, path, load, pred, latency in (("full", full_path, full_load, full_pred, full_latency),
+                                             ("compact", compact_path, compact_load, compact_pred, compact_latency)):
+        report[label] = {
+            "bytes": os.path.getsize(path),
+            "load_ms": load * 1000,
+            "single_row_ms": latency * 1000,
+            "r2": float(r2_score(y_test, pred)),
+            "mae_lakhs": float(mean_absolute_error(y_test, pred)),
+        }
+    report["compact"]["trees"] = compact.n_trees
+    report["compact"]["nodes"] = compact.node_count
+    report["delta"] = {
+        "bytes": report["compact"]["bytes"] / report["full"]["bytes"],
+        "r2": report["compact"]["r2"] - report["full"]["r2"],
+        "mae_lakhs": report["compact"]["mae_lakhs"] - report["full"]["mae_lakhs"],
+    }
+    return report
+
+
+def get_predictor(estimator):
+    # How the app serves a full model: the flat-array engine when it compiles
+    try:
+        return CompiledTrees.from_estimator(estimator)
+    except TypeError:
+        return estimator
+
+
+def print_compact_report(name, report):
+    full, compact, delta = report["full"], report["compact"], report["delta"]
+    print(f"{name}: {compact['trees']} trees, {compact['nodes']} nodes")
+    print(f"  size      {full['bytes'] / 1e6:9.2f} MB -> {compact['bytes'] / 1e6:9.2f} MB ({delta['bytes']:.1%})")
+    print(f"  load      {full['load_ms']:9.1f} ms -> {compact['load_ms']:9.1f} ms")
+    print(f"  1-row     {full['single_row_ms']:9.3f} ms -> {compact['single_row_ms']:9.3f} ms")
+    print(f"  R2        {full['r2']:9.4f}    -> {compact['r2']:9.4f}    ({delta['r2']:+.4f})")
+    print(f"  MAE       {full['mae_lakhs']:9.2f} L  -> {compact['mae_lakhs']:9.2f} L  ({delta['mae_lakhs']:+.2f})")
+
+
+# --- Export / verification CLI ---
+
+def _time_single_row(predict, X, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        predict(X[i % len(X):i % len(X) + 1])
+    return (time.perf_counter() - start) / repeats
+
+
+def random_inputs(n_locations, n_rows=2000, seed=0):
+    """Synthetic [location, total_sqft, bath, bhk] rows spanning the app's input ranges."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(0, n_locations, n_rows),
+        rng.uniform(300, 10000, n_rows).round(),
+        rng.integers(1, 11, n_rows),
+        rng.integers(1, 11, n_rows),
+    ]).astype(float)
+
+
+def verify(estimator, compiled, X, repeats=200):
+    """Compare compiled vs sklearn predictions and single-row latency."""
+    import warnings
+
+    with warnings.catch_warnings():
+        # The estimators were fitted on a DataFrame; plain arrays are what the app passes
+        warnings.simplefilter("ignore", UserWarning)
+        expected = estimator.predict(X)
+        sklearn_latency = _time_single_row(estimator.predict, X, repeats)
+    actual = compiled.predict(X)
+    compiled_latency = _time_single_row(compiled.predict, X, repeats)
+
+    return {
+        'identical': bool(np.array_equal(expected, actual)),
+        'max_abs_diff': float(np.max(np.abs(expected - actual))),
+        'sklearn_ms': sklearn_latency * 1000,
+        'compiled_ms': compiled_latency * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export tree models to flat NumPy arrays")
+    parser.add_argument('names', nargs='*', default=['model', 'decision_tree'],
+                        help="Registry artifact names to export")
+    parser.add_argument('--compact', action='store_true',
+                        help="Write the pruned float32 exports (<name>.compact.npz) instead")
+    parser.add_argument('--max-depth', type=int, help="Compact: prune trees to this depth")
+    parser.add_argument('--max-leaves', type=int, help="Compact: keep at most this many leaves per tree")
+    parser.add_argument('--n-estimators', type=int, help="Compact: keep only the first N trees of a forest")
+    args = parser.parse_args()
+
+    X = random_inputs(len(registry.get('label_encoder').classes_))
+    for name in args.names:
+        try:
+            estimator = registry.get(name)
+        except FileNotFoundError:
+            print(f"Skipping {name}: {registry.path(name)} not found")
+            continue
+
+        if args.compact:
+            limits = dict(COMPACT.get(name, {}))
+            limits.update({k: v for k, v in (("max_depth", args.max_depth), ("max_leaves", args.max_leaves),
+                                              ("n_estimators", args.n_estimators)) if v is not None})
+            _, path = export_compact(estimator, compact_path(name), **limits)
+            # No held-out split here: accuracy is measured against the full model's own predictions.
+            # train.py reports it against the real test set.
+            report = compare_compact(estimator, registry.path(name), path, X, estimator.predict(X))
+            print_compact_report(f"{name} {limits} -> {path} (R2/MAE vs full-model predictions)", report)
+            continue
+
+        compiled = CompiledTrees.from_estimator(estimator)
+        out = os.path.splitext(registry.path(name))[0] + '.npz'
+        compiled.save(out)
+        result = verify(estimator, CompiledTrees.load(out), X)
+
+        print(f"{name}: {compiled.n_trees} trees, {compiled.node_count} nodes, "
+              f"{compiled.nbytes / 1e6:.2f} MB -> {out}")
+        print(f"  identical predictions: {result['identical']} (max diff {result['max_abs_diff']:.3g})")
+        print(f"  single-row latency: sklearn {result['sklearn_ms']:.3f} ms, "
+              f"compiled {result['compiled_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from location_index import normalize_location
+from telemetry import metrics, span
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+PERSIST_DIRECTORY = "./chroma_db"
+QUERY_CACHE_SIZE = 1024
+# Written by ingest_data.py; changes whenever the set of stored documents does
+CORPUS_VERSION_FILE = "corpus_version"
+
+LOCATION_K = 2
+GENERAL_QUERY = "Investment Advice Regulation"
+GENERAL_K = 2
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model with a bounded LRU cache for query vectors.
+
+    Location names repeat constantly, so `embed_query` is memoised by the
+    exact query text. Document embedding is passed straight through.
+    """
+
+    def __init__(self, embeddings, maxsize=QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                metrics.inc("embedding_cache_total", result="hit")
+                return vector
+            self.misses += 1
+        metrics.inc("embedding_cache_total", result="miss")
+
+        # Embed outside the lock; a concurrent miss on the same text just
+        # computes the same vector twice.
+        with span("embed"):
+            vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return vector
+
+    def cache_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._cache),
+                "maxsize": self.maxsize,
+            }
+
+    def cache_clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# --- Process-wide singletons ---
+
+_lock = threading.Lock()
+_embeddings = None
+_vectorstore = None
+
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                # Imported lazily: pulls in sentence-transformers/torch
+                from langchain_huggingface import HuggingFaceEmbeddings
+                _embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL))
+    return _embeddings
+
+
+def get_vectorstore():
+    global _vectorstore
+    if _vectorstore is None:
+        embeddings = get_embeddings()
+        with _lock:
+            if _vectorstore is None:
+                from langchain_community.vectorstores import Chroma
+                _vectorstore = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+    return _vectorstore
+
+
+def query_cache_stats():
+    if _embeddings is None:
+        return CachedEmbeddings(None).cache_stats()
+    return _embeddings.cache_stats()
+
+
+# --- Corpus versioning ---
+
+def write_corpus_version(persist_directory, ids):
+    version = hashlib.sha256("\n".join(sorted(ids)).encode("utf-8")).hexdigest()
+    path = os.path.join(persist_directory, CORPUS_VERSION_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, path)
+    return version
+
+
+def corpus_version(persist_directory=PERSIST_DIRECTORY):
+    try:
+        with open(os.path.join(persist_directory, CORPUS_VERSION_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "unversioned"
+
+
+# --- Location index and precomputed general context ---
+
+def location_aliases(metadata):
+    """Lookup keys for a stored document: its location, each part of a compound
+    location ("Indiranagar & Koramangala"), and any comma-separated `aliases`."""
+    location = metadata.get("location", "")
+    names = [location] + re.split(r"\s*(?:&|/|,|\band\b)\s*", location)
+    names += str(metadata.get("aliases", "")).split(",")
+    return {key for key in map(normalize_location, names) if key}
+
+
+class MarketIndex:
+    """Everything market_research_node needs that does not depend on the request.
+
+    Built once per corpus version: an exact/alias map from normalized location
+    names to their documents, and the general-advice documents that used to be
+    re-queried on every call.
+    """
+
+    def __init__(self, vectorstore, version):
+        self.version = version
+        self.by_location = {}
+        self.by_alias = {}
+
+        stored = vectorstore.get(include=["documents", "metadatas"])
+        seen = set()
+        for text, metadata in zip(stored["documents"], stored["metadatas"]):
+            if text in seen:
+                continue  # stores written before content-hash IDs hold duplicates
+            seen.add(text)
+            metadata = metadata or {}
+            doc = Document(page_content=text, metadata=metadata)
+            self.by_location.setdefault(normalize_location(metadata.get("location", "")), []).append(doc)
+            for key in location_aliases(metadata):
+                self.by_alias.setdefault(key, []).append(doc)
+
+        # Longest keys first so "electronic city" wins over "city"-like keys
+        self._alias_keys = sorted(self.by_alias, key=len, reverse=True)
+        self.general = vectorstore.similarity_search(GENERAL_QUERY, k=GENERAL_K)
+
+    def lookup(self, location, k=LOCATION_K):
+        """Documents for a location from the metadata index, or (None, None) on a miss."""
+        key = normalize_location(location)
+        if not key:
+            return None, None
+        if key in self.by_location:
+            return self.by_location[key][:k], "exact"
+        if key in self.by_alias:
+            return self.by_alias[key][:k], "alias"
+        # e.g. "Electronic City Phase II" -> documents for "Electronic City"
+        padded = f" {key} "
+        for alias in self._alias_keys:
+            if f" {alias} " in padded:
+                return self.by_alias[alias][:k], "alias"
+        return None, None
+
+
+_index = None
+
+
+def get_market_index():
+    global _index
+    version = corpus_version()
+    if _index is None or _index.version != version:
+        vectorstore = get_vectorstore()
+        with _lock:
+            if _index is None or _index.version != version:
+                _index = MarketIndex(vectorstore, version)
+    return _index
+
+
+def search_market(location, k=LOCATION_K):
+    """Location documents plus the precomputed general context.
+
+    Returns (location_docs, general_docs, method) where method is "exact" or
+    "alias" for metadata-index hits (no ANN query) or "vector" when it had to
+    fall back to one similarity search.
+    """
+    index = get_market_index()
+    docs, method = index.lookup(location, k)
+    if docs is None:
+        docs, method = get_vectorstore().similarity_search(location, k=k), "vector"
+    return docs, index.general, method